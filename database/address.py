@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, ForeignKeyConstraint, Integer, String
+from sqlalchemy import Column, ForeignKey, ForeignKeyConstraint, Index, Integer, String
 from database import ROW_INDEX
 from database.base import Base
 from scripts.csv_columns import *
@@ -45,14 +45,16 @@ class Address(Base):
             [f'{ADMINISTRATIVE_UNIT}.name', f'{ADMINISTRATIVE_UNIT}.province'],
             name='fk_admin_division',
             deferrable=True,
-            initially='DEFERRED'
+            initially='IMMEDIATE'
             # This composite foreign key overwrites the default 'province' foreign key.
             # by linking both 'administrative_division' and 'province' together in a composite foreign key.
-            # The constraint is deferred, meaning it's checked at the end of the transaction.
+            # The constraint is checked per statement. Bulk loads insert parent tables first (see 'upsert_datasets'),
+            # which avoids queueing a deferred trigger event for every inserted row until COMMIT.
             # If both columns are NULL, the constraint is omitted or skipped for the row.
         ),
+        Index('ix_address_admin_fk', administrative_division, province),
     )
 
-ADDRESS_DB_COLUMNS: list[str] = Address.table_columns()
+ADDRESS_DB_COLUMNS: tuple[str, ...] = Address.table_columns()
 
 
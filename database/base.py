@@ -1,6 +1,6 @@
 from functools import lru_cache
 import logging
-from typing import List, Union, Tuple
+from typing import Union, Tuple
 from sqlalchemy import Column, ForeignKey, Table, inspect
 from sqlalchemy.orm import DeclarativeBase, Mapper
 from sqlalchemy.types import TypeEngine
@@ -14,15 +14,26 @@ class Base(DeclarativeBase):
         cls,
         exclude: set[str] = set(),
         typed: bool = False
-    ) -> List[Union[Tuple[str, TypeEngine], str]]:
+    ) -> Tuple[Union[Tuple[str, TypeEngine], str], ...]:
         """
         Returns column names (and optionally types) for a mapped class,
-        excluding specified column names.
+        excluding specified column names. The tuple is shared between calls.
         """
+        return cls.cached_table_columns(frozenset(exclude), typed)
+
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def cached_table_columns(
+        cls,
+        exclude: frozenset[str],
+        typed: bool
+    ) -> Tuple[Union[Tuple[str, TypeEngine], str], ...]:
+        """ Inspects the mapper once per (class, exclude, typed) and caches the columns """
         map: Mapper = inspect(cls)
         cols: list[Column] = [col for col in map.columns if col.name not in exclude]
         
-        return [(col.name, col.type) if typed else col.name for col in cols]
+        return tuple((col.name, col.type) if typed else col.name for col in cols)
 
 
     @staticmethod
@@ -34,6 +45,7 @@ class Base(DeclarativeBase):
         onupdate: str = 'CASCADE',
         primary_key: bool = False,
         nullable: bool = True,
+        index: bool = True, # PostgreSQL does not index foreign keys; cascades would otherwise scan the child table
         name: str = None
     ) -> Column:
         return Column(
@@ -41,6 +53,7 @@ class Base(DeclarativeBase):
             ForeignKey(ref, ondelete=ondelete, onupdate=onupdate),
             primary_key=primary_key,
             nullable=nullable,
+            index=index,
             name=name
         )
 
@@ -1,11 +1,12 @@
 import json
+from functools import lru_cache
 from typing import TypedDict
 import pandas as pd
 from sqlalchemy import Column, Float, PrimaryKeyConstraint, String, Date
 from database import EXCHANGE_RATE
 from scripts.csv_columns import CURRENCY, DATE
 from database.base import Base
-from settings import EXCHANGE_RATES_PATH
+from settings import EXCHANGE_RATES_CACHE, EXCHANGE_RATES_PATH
 
 
 class CurrencyBundle(TypedDict):
@@ -26,29 +27,43 @@ class ExchangeRate(Base):
 
     __table_args__ = (
         PrimaryKeyConstraint(DATE, CURRENCY),
+        {'postgresql_partition_by': f'RANGE ("{DATE}")'}, # Yearly partitions are pruned on date range lookups
     )
 
     @staticmethod
-    def load_exchange_rates() -> dict[pd.Timestamp, dict[str, float]]:
+    @lru_cache(maxsize=1)
+    def load_exchange_rates() -> pd.DataFrame:
+        ''' 
+        Loads the exchange rates as a long (Date, Currency, USD) frame.
+        The parsed JSON is cached as Parquet and reused while it is newer than the JSON.
+        '''
         if not EXCHANGE_RATES_PATH.exists():
             raise FileNotFoundError(f"There is no file in {EXCHANGE_RATES_PATH}")
+        if EXCHANGE_RATES_CACHE.exists() and EXCHANGE_RATES_CACHE.stat().st_mtime >= EXCHANGE_RATES_PATH.stat().st_mtime:
+            return pd.read_parquet(EXCHANGE_RATES_CACHE)
         with open(EXCHANGE_RATES_PATH, 'r') as file:
             data: dict = json.load(file)
-            return {
-                pd.to_datetime(date): rates
-                for date, rates in data.items()
-            }
+        rates: pd.DataFrame = pd.DataFrame.from_dict(data, orient='index') # Dates as rows, currencies as columns
+        rates.index = pd.to_datetime(rates.index, format='%Y-%m-%d') # Parses each unique date once, before stacking
+        rates = (
+            rates
+            .rename_axis(index=DATE, columns=CURRENCY)
+            .stack()
+            .rename('USD')
+            .reset_index()
+        )
+        rates.to_parquet(EXCHANGE_RATES_CACHE, index=False, compression='zstd')
+        return rates
 
     @staticmethod
-    def database_entries() -> list[CurrencyBundle]:
-        exchange_rates = ExchangeRate.load_exchange_rates()
+    def yearly_partitions(dates: pd.Series) -> list[str]:
+        ''' Returns CREATE TABLE statements for the yearly range partitions covering the given dates '''
         return [
-            {DATE: date, CURRENCY: currency, 'USD': rate}
-            for date, rates in exchange_rates.items()
-            for currency, rate in rates.items()
+            f'CREATE TABLE IF NOT EXISTS "{EXCHANGE_RATE} {year}" PARTITION OF "{EXCHANGE_RATE}" '
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01');\n"
+            for year in sorted(pd.DatetimeIndex(dates).year.unique())
         ]
 
-
-
-
-
+    @staticmethod
+    def database_entries() -> list[CurrencyBundle]:
+        return ExchangeRate.load_exchange_rates().to_dict(orient='records')
@@ -1,15 +1,19 @@
 from sqlalchemy import Column, String
+from sqlalchemy.orm import relationship
 from database.base import Base
 from scripts.csv_columns import *
 
 class Amenity(Base):
     __tablename__ = AMENITIES
     type = Column(String(), primary_key=True)
+    property_links = relationship('Property_Amenities', back_populates='amenity', lazy='raise_on_sql', passive_deletes=True)
 
 class Appliance(Base):
     __tablename__ = APPLIANCES
     type = Column(String(), primary_key=True)
+    property_links = relationship('Property_Appliances', back_populates='appliance', lazy='raise_on_sql', passive_deletes=True)
 
 class Parking(Base):
     __tablename__ = PARKING
     type = Column(String(), primary_key=True)
+    property_links = relationship('Property_Parking', back_populates='parking', lazy='raise_on_sql', passive_deletes=True)
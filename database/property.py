@@ -1,6 +1,7 @@
+from functools import cache
 from database import LISTING, PROPERTY_AMENITIES, PROPERTY_APPLIANCES, PROPERTY_PARKING, ROW_INDEX, PROPERTY
-from sqlalchemy import Column, Date, Float, Integer, String, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Date, Integer, Numeric, String, Boolean
+from sqlalchemy.orm import relationship, selectinload
 from database.base import Base
 from scripts.csv_columns import *
 
@@ -16,11 +17,11 @@ class Listing(Base):
     __tablename__ = LISTING
     id = Column(Integer(), primary_key=True, name=ROW_INDEX)
     date = Column(Date(), name=DATE)
-    price = Column(Float(), name=PRICE)
+    price = Column(Numeric(precision=12, scale=2), name=PRICE)
     currency = Base.add_foreign_key(String(4), f'{CURRENCY}.code', name=CURRENCY)
     duration = Column(String(), name=DURATION)
 
-LISTING_DB_COLUMNS: list[str] = Listing.table_columns()
+LISTING_DB_COLUMNS: tuple[str, ...] = Listing.table_columns()
 
 class Property(Base):
     __tablename__ = PROPERTY
@@ -32,7 +33,7 @@ class Property(Base):
     floor_area = Column(Integer(), name=FLOOR_AREA)
     rooms = Column(Integer(), name=ROOMS)
     bathrooms = Column(Integer(), name=BATHROOMS)
-    ceiling_height = Column(Float(), name=CEILING_HEIGHT)
+    ceiling_height = Column(Numeric(precision=12, scale=2), name=CEILING_HEIGHT)
     renovation = Base.add_foreign_key(String(), f'{RENOVATION}.type', name=RENOVATION)
     construction = Base.add_foreign_key(String(), f'{CONSTRUCTION}.type', name=CONSTRUCTION)
     balcony = Column(Boolean(), name=BALCONY)
@@ -43,10 +44,17 @@ class Property(Base):
     utility_payments = Column(Integer(), name='Utility Payments')
     listing = Base.add_foreign_key(Integer(), f'{LISTING}.{ROW_INDEX}', name=LISTING)
 
-PROPERTY_DB_COLUMNS: list[str] = Property.table_columns()
+    # Feature links raise rather than lazy load one SELECT per Property (N+1).
+    # Load them explicitly with property_feature_loads(), e.g. select(Property).options(*property_feature_loads())
+    amenity_links = relationship('Property_Amenities', back_populates='property', lazy='raise_on_sql', passive_deletes=True)
+    appliance_links = relationship('Property_Appliances', back_populates='property', lazy='raise_on_sql', passive_deletes=True)
+    parking_links = relationship('Property_Parking', back_populates='property', lazy='raise_on_sql', passive_deletes=True)
+
+PROPERTY_DB_COLUMNS: tuple[str, ...] = Property.table_columns()
 
 def property_id_fk():
-    return Base.add_foreign_key(Integer(), f'{PROPERTY}.{ROW_INDEX}', name="Property_ID", primary_key=True)
+    # Leading column of the composite primary key, which already indexes it
+    return Base.add_foreign_key(Integer(), f'{PROPERTY}.{ROW_INDEX}', name="Property_ID", primary_key=True, index=False)
 
 def feature_fk(type_name: str):
     return Base.add_foreign_key(String(), f'{type_name}.type', primary_key=True, name=f'{type_name}_type')
@@ -55,19 +63,29 @@ class Property_Amenities(Base):
     __tablename__ = PROPERTY_AMENITIES
     property_id = property_id_fk()
     Amenities_type = feature_fk(AMENITIES)
-    property = relationship('Property', backref=AMENITIES)
-    amenity = relationship('Amenity', backref=PROPERTY)
+    property = relationship('Property', back_populates='amenity_links', lazy='raise_on_sql')
+    amenity = relationship('Amenity', back_populates='property_links', lazy='raise_on_sql')
 
 class Property_Appliances(Base):
     __tablename__ = PROPERTY_APPLIANCES
     property_id = property_id_fk()
     Appliances_type = feature_fk(APPLIANCES)
-    property = relationship(PROPERTY, backref=APPLIANCES)
-    appliance = relationship(APPLIANCES, backref=PROPERTY)
+    property = relationship('Property', back_populates='appliance_links', lazy='raise_on_sql')
+    appliance = relationship('Appliance', back_populates='property_links', lazy='raise_on_sql')
 
 class Property_Parking(Base):
     __tablename__ = PROPERTY_PARKING
     property_id = property_id_fk()
     parking_type = feature_fk(PARKING)
-    property = relationship('Property', backref=PARKING)
-    parking = relationship('Parking', backref=PROPERTY)
\ No newline at end of file
+    property = relationship('Property', back_populates='parking_links', lazy='raise_on_sql')
+    parking = relationship('Parking', back_populates='property_links', lazy='raise_on_sql')
+
+@cache
+def property_feature_loads() -> tuple:
+    # Batches each feature collection into one 'IN (...)' SELECT per set of Property rows.
+    # Built on first use: loader options configure every mapper, which needs 'database.feature' imported.
+    return (
+        selectinload(Property.amenity_links).selectinload(Property_Amenities.amenity),
+        selectinload(Property.appliance_links).selectinload(Property_Appliances.appliance),
+        selectinload(Property.parking_links).selectinload(Property_Parking.parking),
+    )
@@ -1,15 +1,15 @@
-from scripts.compile import compile_sql
+from scripts.compile import upsert_datasets
 from scripts.entity import render_entity_relationship_diagram
 from scripts.load import load
-from settings import SQL_PATH
+from settings import SCHEMA_SQL_PATH
 
 training, testing, addresses = load()
 
 '''
-sql: str = compile_sql([training, testing])
+schema: str = upsert_datasets([training, testing])
 
-with open(SQL_PATH, "w", encoding="utf-8") as file: 
-    file.write(sql)
+with open(SCHEMA_SQL_PATH, "w", encoding="utf-8") as file: 
+    file.write(schema)
 
 render_entity_relationship_diagram()
 '''
\ No newline at end of file
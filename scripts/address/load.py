@@ -2,48 +2,76 @@ import logging
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
+from pandas.api.types import CategoricalDtype, union_categoricals
 from scripts.address import TESTING_INDEX_PREFIX, TRAINING_INDEX_PREFIX
-from scripts.address.normalize import normalize_address_parts
+from scripts.address.normalize import normalize_address_series
 from scripts.api.geocode import load_geocoded_components
 from scripts.api.translate import load_translations
 from scripts.process import explode_addresses_on_index, string_casts, merge_on_unique
 from scripts.address.separate import separate_into_unique_components, separate_on_hardcoded_delimiters, separate_hardcoded_regional_labels
-from settings import ADDRESSES, INPUTS, TESTING_FILE, TRAINING_FILE
+from settings import ADDRESSES, ADDRESSES_CACHE, INPUTS, TESTING_FILE, TRAINING_FILE
 from scripts.csv_columns import *
 
 
 def save_index(df: DataFrame, fileindex: str, file: str) -> DataFrame:
-    df[ADDRESS_INDEX] = [f"{fileindex}{i}" for i in range(len(df))]
+    df[ADDRESS_INDEX] = (fileindex + pd.Series(np.arange(len(df)).astype(str), index=df.index)).astype("string")
     df.to_csv(INPUTS / file, index=False, encoding="utf-8-sig")
     logging.debug(f"'{file}' has been saved with an address-index mapping.")
     return df
 
 
+def read_addresses() -> DataFrame:
+    ''' Reads 'addresses.csv' via a Parquet cache, rebuilt whenever the CSV is newer (e.g. after manual corrections) '''
+    if ADDRESSES_CACHE.exists() and ADDRESSES_CACHE.stat().st_mtime >= ADDRESSES.stat().st_mtime:
+        return pd.read_parquet(ADDRESSES_CACHE).fillna(np.nan) # Missing object values as NaN, matching read_csv
+    addresses: DataFrame = pd.read_csv(ADDRESSES, encoding="utf-8")
+    addresses.to_parquet(ADDRESSES_CACHE, index=False, compression='zstd')
+    return addresses
+
+
+def save_addresses(df: DataFrame) -> None:
+    ''' Saves the editable CSV followed by its Parquet cache '''
+    df.to_csv(ADDRESSES, index=False, encoding="utf-8-sig", na_rep="")
+    df.to_parquet(ADDRESSES_CACHE, index=False, compression='zstd')
+
+
+def normalize_address_keys(series: pd.Series) -> pd.Series:
+    """ Strips and lower-cases addresses into the keys used for grouping and merging on ADDRESS. """
+    return series.str.strip().str.lower()
+
+
 def map_address_indices(training: DataFrame, testing: DataFrame) -> DataFrame:
     """
     Associates each unique address with a list of row-level address indices
     from both training and testing datasets.
+    The returned ADDRESS column is already normalized with 'normalize_address_keys'.
     """
     training = save_index(training, TRAINING_INDEX_PREFIX, TRAINING_FILE)
     testing = save_index(testing, TESTING_INDEX_PREFIX, TESTING_FILE)
 
-    combined = pd.concat([training, testing])
+    # Stacks only the two columns grouped on as 1-D arrays, without building a combined DataFrame
+    addresses = pd.Series(np.concatenate([df[ADDRESS].to_numpy(dtype=object) for df in (training, testing)]), name=ADDRESS)
+    indices = pd.Series(np.concatenate([df[ADDRESS_INDEX].to_numpy(dtype=object) for df in (training, testing)]), name=ADDRESS_INDEX)
 
     # Normalize addresses for consistent grouping
-    combined[ADDRESS] = combined[ADDRESS].str.strip().str.lower()
+    keys = normalize_address_keys(addresses).astype('category') # Groups on integer codes rather than hashing strings
 
     # Group by address and collect all row-level indices
     address_indices = (
-        combined
-        .groupby(ADDRESS)[ADDRESS_INDEX]
-        .apply(list)
-        .to_frame()
+        indices
+        .groupby(keys, observed=True)
+        .agg(list)
         .reset_index()
     )
 
     return address_indices
 
 
+def shared_categories(*series: pd.Series) -> CategoricalDtype:
+    """ A CategoricalDtype covering the values of every Series, so they can be merged on integer codes. """
+    return CategoricalDtype(union_categoricals([s.astype(object).astype('category') for s in series]).categories)
+
+
 def remap_address_row_indices(training: DataFrame, testing: DataFrame, unique_addresses: DataFrame) -> DataFrame:
     logging.info("Remapping address indices")
 
@@ -54,12 +82,15 @@ def remap_address_row_indices(training: DataFrame, testing: DataFrame, unique_ad
 
     address_indices_map: DataFrame = map_address_indices(training, testing)
 
-    # Normalize address columns to ensure consistent merging
-    address_indices_map[ADDRESS] = address_indices_map[ADDRESS].str.strip().str.lower()
-    unique_addresses[ADDRESS] = unique_addresses[ADDRESS].str.strip().str.lower()
+    # Normalize addresses to ensure consistent merging (address_indices_map is normalized by map_address_indices)
+    unique_addresses[ADDRESS] = normalize_address_keys(unique_addresses[ADDRESS])
+
+    address_dtype = shared_categories(address_indices_map[ADDRESS], unique_addresses[ADDRESS])
+    address_indices_map[ADDRESS] = address_indices_map[ADDRESS].astype(address_dtype)
+    unique_addresses[ADDRESS] = unique_addresses[ADDRESS].astype(address_dtype)
 
-    # Merge with full DataFrame
-    unique_addresses = unique_addresses.merge(address_indices_map, on=ADDRESS, how="left")
+    # Join with full DataFrame against the address-indexed map
+    unique_addresses = unique_addresses.join(address_indices_map.set_index(ADDRESS), on=ADDRESS, how="left", sort=False)
 
     total = len(unique_addresses)
     missing = unique_addresses[unique_addresses[ADDRESS_INDEX].isna()]
@@ -71,7 +102,7 @@ def remap_address_row_indices(training: DataFrame, testing: DataFrame, unique_ad
     if not missing.empty:
         logging.warning(f"{len(missing)} addresses could not be mapped: {missing}")
 
-    unique_addresses.to_csv(ADDRESSES, index=False, encoding="utf-8-sig")
+    save_addresses(unique_addresses)
     logging.info("Saved and reindexed 'training' and 'testing' data on 'Address'")
     return unique_addresses
 
@@ -85,7 +116,7 @@ def load_address_mapping(training: DataFrame, testing: DataFrame) -> DataFrame:
     '''
     if ADDRESSES.exists():
 
-        addresses: DataFrame = pd.read_csv(ADDRESSES, encoding="utf-8")
+        addresses: DataFrame = read_addresses()
 
         if ADDRESS_INDEX not in training.columns or ADDRESS_INDEX not in testing.columns or ALWAYS_REMAP:
             logging.info(f"Remapping {len(addresses)} address indices")
@@ -123,25 +154,20 @@ def process_address_mapping(training: DataFrame, testing: DataFrame) -> DataFram
 
     logging.debug("Parsing addresses...")
 
-    unique_addresses: DataFrame = (merge_on_unique([training[ADDRESS], testing[ADDRESS]]).astype(str).to_frame(name=ADDRESS).reset_index(drop=True)) # Deduplicated
+    unique_addresses: DataFrame = merge_on_unique([training[ADDRESS], testing[ADDRESS]]).astype(str).to_frame(name=ADDRESS) # Deduplicated
     unique_addresses: DataFrame = load_translations(unique_addresses) # Loads Google Cloud Translate responses.
     unique_addresses: DataFrame = load_geocoded_components(unique_addresses) # Obtains geocoded responses for native and english language addresses including coordinates from Nominatim / Yandex / Azure / LibPostal
     
-    unique_addresses[BLOCK] = ""; unique_addresses[LANE] = ""
+    unique_addresses = unique_addresses.assign(**{BLOCK: "", LANE: ""})
     
     logging.debug("Normalizing abbreviations / spaces / punctuation / ASCII")
 
-    unique_addresses.update({
-        col: unique_addresses[col].apply(normalize_address_parts)
-        for col in [TRANSLATED, STREET, NEIGHBOURHOOD]
-    })
+    for col in [TRANSLATED, STREET, NEIGHBOURHOOD]:
+        unique_addresses[col] = normalize_address_series(unique_addresses[col])
 
     logging.debug("Separating streets and cities on hardcoded delimiters.")
 
-    unique_addresses[[STREET, TOWN]] = unique_addresses.apply( # Uses "," and "›" separators for failed geocoding attempts.
-        lambda x: separate_on_hardcoded_delimiters(x, [STREET, TOWN])
-        , axis=1
-    ) 
+    unique_addresses[[STREET, TOWN]] = separate_on_hardcoded_delimiters(unique_addresses, [STREET, TOWN]) # Uses "," and "›" separators for failed geocoding attempts.
 
     logging.debug("Separating streets into unique components.")
 
@@ -156,9 +182,9 @@ def process_address_mapping(training: DataFrame, testing: DataFrame) -> DataFram
     unique_addresses[ADDRESS_COLUMNS] = unique_addresses[ADDRESS_COLUMNS].apply(string_casts) # Uses Pandas "string" dtype
 
     address_indices_map: DataFrame = map_address_indices(training, testing) # Map row indices in datasets to lists of row indices in unique_addresses
-    unique_addresses = unique_addresses.merge(address_indices_map, on=ADDRESS, how="left")
+    unique_addresses = unique_addresses.join(address_indices_map.set_index(ADDRESS), on=ADDRESS, how="left", sort=False)
 
-    unique_addresses.to_csv(ADDRESSES, index=False, encoding="utf-8-sig", na_rep="")
+    save_addresses(unique_addresses)
     logging.debug("All addresses have been parsed and saved.")
 
     #unique_addresses = explode_addresses_on_index(unique_addresses, ADDRESS_INDEX) # Creates a separate row for each index mapping.
@@ -1,62 +1,110 @@
 import json
 import logging
-from typing import Union
+import pickle
+from functools import lru_cache
+from typing import Collection, Union
+import numpy as np
 from numpy import ndarray
 import pandas as pd
 from scripts.csv_columns import *
-from settings import ARMENIAN_REGION, FUZZY_MATCH_ACCURACY
-from rapidfuzz import process
+from settings import ARMENIAN_REGION, ARMENIAN_REGION_CACHE, FUZZY_MATCH_ACCURACY
+from rapidfuzz import fuzz, process
 from settings import FUZZY_MATCH_ACCURACY
 
 
-def retrieve_armenian_regional_structure() -> tuple[set[str], dict[str, str], dict[str, str]]:
-    ''' Retrieves the Armenian regional structured based on Wikipedia '''
+RegionalStructure = tuple[frozenset[str], dict[str, str], dict[str, str]]
 
-    if not ARMENIAN_REGION.exists():
-        return set(), {}, {}
 
-    with (ARMENIAN_REGION).open('r', encoding='utf-8') as f:
-        regional_structure: dict = json.load(f)
+def parse_armenian_regional_structure(regional_structure: dict) -> RegionalStructure:
+    ''' Projects the nested regional JSON into provinces, administrative unit → province and locality → municipality mappings '''
+
+    provinces = set()
+    administrative_units_mapping = dict()
+    locality_mapping = dict()
+
+    for province, data in regional_structure.items():
 
-    if regional_structure:
+        provinces.add(province)
 
-        provinces = set()
-        administrative_units_mapping = dict()
-        locality_mapping = dict()
+        if isinstance(data, list):
+            for d in data:
+                # Yerevan districts
+                administrative_units_mapping[d] = province
 
-        for province, data in regional_structure.items():
+        else:
+            municipality_data: dict[str, dict[str, dict[str, str]]] = data
 
-            provinces.add(province)
+            for municipality, localities in municipality_data.items():
+                administrative_units_mapping[municipality] = province
 
-            if isinstance(data, list):
-                for d in data:
-                    # Yerevan districts
-                    administrative_units_mapping[d] = province
+                for locality in localities: 
+                    locality_mapping[locality] = municipality
 
-            else:
-                municipality_data: dict[str, dict[str, dict[str, str]]] = data
+    return (frozenset(provinces), administrative_units_mapping, locality_mapping)
 
-                for municipality, localities in municipality_data.items():
-                    administrative_units_mapping[municipality] = province
 
-                    for locality in localities: 
-                        locality_mapping[locality] = municipality
+@lru_cache(maxsize=None)
+def retrieve_armenian_regional_structure() -> RegionalStructure:
+    ''' 
+    Retrieves the Armenian regional structured based on Wikipedia. Parsed once and cached; treat the mappings as read-only. 
+    The parsed structure is pickled next to the JSON and reused until the JSON is modified.
+    '''
 
-        return (provinces, administrative_units_mapping, locality_mapping)
+    if not ARMENIAN_REGION.exists():
+        return frozenset(), {}, {}
+
+    if ARMENIAN_REGION_CACHE.exists() and ARMENIAN_REGION_CACHE.stat().st_mtime >= ARMENIAN_REGION.stat().st_mtime:
+        with ARMENIAN_REGION_CACHE.open('rb') as f:
+            return pickle.load(f)
+
+    with (ARMENIAN_REGION).open('r', encoding='utf-8') as f:
+        regional_structure: dict = json.load(f)
+
+    structure = parse_armenian_regional_structure(regional_structure or {})
+
+    with ARMENIAN_REGION_CACHE.open('wb') as f:
+        pickle.dump(structure, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return structure
     
 
-def fuzzy_match(string: str, choices: set) -> str:
+def fuzzy_match(string: str, choices: Collection[str]) -> str:
     # Remove commas and use spaces as delimiters
     words = string.title().replace(',', '').split()
-    # Try match for each word
+    # Try match for each word (O(1) membership on a set or dict keys)
     for word in words:
         if word in choices:
             return word
     # Fallback fuzzy match is used
-    matches = process.extractOne(string, choices, score_cutoff=FUZZY_MATCH_ACCURACY)
+    matches = process.extractOne(string, choices, scorer=fuzz.WRatio, score_cutoff=FUZZY_MATCH_ACCURACY)
     return matches[0] if matches else ""
 
 
+def fuzzy_match_series(series: pd.Series, choices: Collection[str]) -> pd.Series:
+    """
+    Applies fuzzy_match over a whole Series.
+    Exact word hits are found with a single explode / isin, the remainder is scored in one RapidFuzz cdist call.
+    """
+    choices = list(choices)
+    strings = series.fillna("").astype(str).reset_index(drop=True)
+
+    # Remove commas and use spaces as delimiters, keeping the first word found in choices
+    words = strings.str.title().str.replace(',', '', regex=False).str.split().explode()
+    exact = words[words.isin(choices)]
+    matches = exact[~exact.index.duplicated()].reindex(strings.index)
+
+    # Fallback fuzzy match over every remaining string at once
+    residual = strings[matches.isna()]
+
+    if not residual.empty and choices:
+        scores = process.cdist(residual.tolist(), choices, scorer=fuzz.WRatio, score_cutoff=FUZZY_MATCH_ACCURACY, workers=-1)
+        best = scores.argmax(axis=1) # First best choice, as with extractOne
+        found = scores[np.arange(len(residual)), best] >= FUZZY_MATCH_ACCURACY
+        matches[residual.index] = np.where(found, np.array(choices, dtype=object)[best], "")
+
+    return pd.Series(matches.fillna("").to_numpy(dtype=object), index=series.index)
+
+
 def reverse_lookup(name: str, mapping: dict) -> str:
     return mapping.get(name, "")
 
@@ -70,17 +118,18 @@ def administrative_pairs(df: pd.DataFrame) -> list[dict[str, str]]:
         df[col] = df[col].apply(lambda x: x.strip() if isinstance(x, str) else None)
 
     # Use .notna() instead of != None for clarity and correctness
-    unique_admin_units = df[ADMINISTRATIVE_UNIT].unique()
-    valid_pairs = df[df[PROVINCE].notna()][ADMINISTRATIVE_UNIT].unique()
+    unique_admin_units = df[ADMINISTRATIVE_UNIT].dropna().unique()
+    valid_pairs = df[df[PROVINCE].notna()][ADMINISTRATIVE_UNIT].dropna().unique()
 
-    for unit in set(unique_admin_units) - set(valid_pairs):
-        logging.error(f"No valid province found for '{unit}'")
+    missing: ndarray = np.setdiff1d(unique_admin_units, valid_pairs, assume_unique=True)
+    if missing.size:
+        logging.error(f"No valid province found for {missing.tolist()}")
 
     return (
         df[df[ADMINISTRATIVE_UNIT].notna() & df[PROVINCE].notna()]
         .drop_duplicates()
-        .apply(lambda row: {'name': row[ADMINISTRATIVE_UNIT], 'province': row[PROVINCE]}, axis=1)
-        .tolist()
+        .rename(columns={ADMINISTRATIVE_UNIT: 'name', PROVINCE: 'province'})[['name', 'province']]
+        .to_dict('records')
     )
 
 
@@ -1,8 +1,8 @@
 import re, logging
 import unicodedata
+import numpy as np
 import pandas as pd
 from database.currency import ExchangeRate
-from scripts.api.translate import is_non_english_string
 from scripts.csv_columns import *
 
 ORDINAL_SUFFIX = r'(st|nd|rd|th)'
@@ -24,30 +24,30 @@ def normalize_string(value: str) -> str:
     return value.strip().title()
 
 def title_strip_remove_punctuation_whitespace(col: pd.Series) -> pd.Series:
-    return col.apply(normalize_string)
+    ''' Applies 'normalize_string' once per unique value and maps the results back by factorized code '''
+    codes, uniques = pd.factorize(col) # Missing values are coded -1
+    normalized = np.array([normalize_string(value) for value in uniques] + [''], dtype=object)
+    return pd.Series(normalized[codes], index=col.index, name=col.name)
 
 ORDINAL_RGX = re.compile(rf'(\d+)-?{ORDINAL_SUFFIX}', flags=re.IGNORECASE)
 
-def fix_ordinals(string: str) -> str:
-    """Removes dashes or spaces in ordinals (e.g., '2-nd' or '3 rd' → '2nd', '3rd')."""
-    return ORDINAL_RGX.sub(r'\1\2', string)
-
 ALPHANUMERIC_CODE_RGX = re.compile(r'\b(\d{1,5})\s+([A-Za-z])\b')
-
-def fix_alphanumeric_codes(string: str) -> str:
-    """Joins digits followed by trailing letters (e.g., '123 A' → '123A')."""
-    return ALPHANUMERIC_CODE_RGX.sub(r'\1\2', string)
-
 STREET_RGX = re.compile(r'\b(st\.?|street|str|srteet|stret\.?)\b', flags=re.IGNORECASE)
 HIGHWAY_RGX = re.compile(r'\b(hwy|highway)\b', flags=re.IGNORECASE)
 AVENUE_RGX = re.compile(r'\b(ave|avenue|avenu)\b', flags=re.IGNORECASE)
 
-def expand_abbreviations(name: str) -> str:
-    name = STREET_RGX.sub('Street', name)
-    name = HIGHWAY_RGX.sub('Highway', name)
-    name = AVENUE_RGX.sub('Avenue', name)
-    name = name.replace("Blok", "Block")
-    return name
+ABBREVIATIONS = {'Street': STREET_RGX, 'Highway': HIGHWAY_RGX, 'Avenue': AVENUE_RGX}
+
+# Alphanumeric codes and abbreviations are matched in a single scan and dispatched on the group name
+ADDRESS_TOKEN_RGX = re.compile(
+    '|'.join([f'(?P<Code>{ALPHANUMERIC_CODE_RGX.pattern})', *(f'(?P<{name}>{rgx.pattern})' for name, rgx in ABBREVIATIONS.items())]),
+    flags=re.IGNORECASE
+)
+
+def replace_address_token(match: re.Match) -> str:
+    if match.lastgroup == 'Code':
+        return ALPHANUMERIC_CODE_RGX.sub(r'\1\2', match.group(0)) # '123 A' → '123A'
+    return match.lastgroup # Expanded abbreviation
 
 def integer_to_ordinal(n: int) -> str:
     """Returns an integer into its ordinal form."""
@@ -59,53 +59,49 @@ def integer_to_ordinal(n: int) -> str:
 
 DIGIT_NEIGHBOURHOOD_RGX = re.compile(rf'\b(\d+)[\s\-]*({NEIGHBOURHOOD_SUFFIX})\b', flags=re.IGNORECASE)
 
-def fix_neighborhood_prefixes(string: str) -> str:
-    """Applies ordinal suffixes to numeric identifiers in all neighbourhoods. (I.E. 1 Quarter becomes 1st Quarter) """
-    def substitute(match: re.Match):
-        num, label = match.group(1), match.group(2)
-        try: return f"{integer_to_ordinal(int(num))} {label}"
-        except ValueError: return match.group(0)
-    return DIGIT_NEIGHBOURHOOD_RGX.sub(substitute, string)
-
-def apply_title_casing(string: str) -> str:
-    ''' Ignores ordinal patterns when title casing a string '''
-    return ' '.join(word if ORDINAL_RGX.match(word) else word.capitalize() for word in string.split())
-
-def remove_ascii(string: str) -> str:
-    ''' Return "" if all characters in the string are ASCII excluding "›" delimiters '''
-    if is_non_english_string(string): return ""
-    else: return string
+def ordinalize_neighbourhood(match: re.Match) -> str:
+    num, label = match.group(1), match.group(2)
+    try: return f"{integer_to_ordinal(int(num))} {label}"
+    except ValueError: return match.group(0)
+
+def capitalize_word(match: re.Match) -> str:
+    ''' Ignores ordinal patterns when title casing a word '''
+    word = match.group(0)
+    return word if ORDINAL_RGX.match(word) else word.capitalize()
+
+
+NON_ASCII_RGX = re.compile(r'[^\x00-\x7F]')
+WORD_RGX = re.compile(r'\S+')
+SPACES_RGX = re.compile(r'\s+')
+
+def normalize_address_series(series: pd.Series) -> pd.Series:
+    ''' Normalizes abbreviations / whitespace / punctuation (and removes non-English strings), running each substitution once over the whole Series '''
+    strings: pd.Series = series.where(series.map(lambda x: isinstance(x, str)), "").astype(object)
+    strings = strings.str.replace(WHITESPACE_RGX, ' ', regex=True)
+    # Removes non-English strings (see 'scripts.api.translate.is_non_english_string')
+    non_english = ~strings.str.contains('›', regex=False) & strings.str.contains(NON_ASCII_RGX)
+    strings = strings.mask(non_english, "")
+    return (
+        strings
+        .str.replace(ORDINAL_RGX, r'\1\2', regex=True) # '2-nd' → '2nd'
+        .str.replace(DIGIT_NEIGHBOURHOOD_RGX, ordinalize_neighbourhood, regex=True) # '1 Quarter' → '1st Quarter'
+        .str.replace(ADDRESS_TOKEN_RGX, replace_address_token, regex=True) # '123 A' → '123A', 'St' → 'Street'
+        .str.replace("Blok", "Block", regex=False)
+        .str.replace(SPACES_RGX, ' ', regex=True)
+        .str.strip()
+        .str.replace(WORD_RGX, capitalize_word, regex=True)
+    )
 
 def normalize_address_parts(string: str) -> str:
-    ''' Normalizes abbreviations / whitespace / punctuation (and removes non-English strings) '''
-    if not isinstance(string, str):
-        return ""
-    try:
-        string = WHITESPACE_RGX.sub(' ', string)
-        string = remove_ascii(string)
-
-        if string == "": 
-            return string
-        
-        else:
-            string = fix_ordinals(string)
-            string = fix_neighborhood_prefixes(string)
-            string = fix_alphanumeric_codes(string)
-            string = expand_abbreviations(string)
-            string = apply_title_casing(string)
-            #logging.debug(f"Parsed {string} succesfully")
-            return string
-        
-    except Exception as e:
-        logging.warning(f"Error when parsing '{string}' : {e}")
+    ''' Normalizes a single address part with 'normalize_address_series' '''
+    return normalize_address_series(pd.Series([string], dtype=object)).iloc[0]
 
 
 def apply_usd_monthly_pricing(df: pd.DataFrame) -> pd.DataFrame:
     logging.debug(f"Converting '{PRICE}' to monthly USD equivalents (vectorized)")
 
     # Load and merge exchange rates
-    exchange_rates = ExchangeRate.database_entries()
-    exchange_rates = pd.DataFrame(exchange_rates).rename(columns={'USD': 'RATE_TO_USD'})
+    exchange_rates = ExchangeRate.load_exchange_rates().rename(columns={'USD': 'RATE_TO_USD'})
 
     df = df.merge(exchange_rates, on=[DATE, CURRENCY], how='left')
 
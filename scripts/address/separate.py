@@ -3,7 +3,7 @@ import json, re
 from typing import Optional
 import pandas as pd
 from pandas import DataFrame
-from scripts.address.lookup import fuzzy_match, retrieve_armenian_regional_structure, reverse_lookup
+from scripts.address.lookup import fuzzy_match_series, retrieve_armenian_regional_structure
 from scripts.address.normalize import NEIGHBOURHOOD_SUFFIX, ORDINAL_RGX, ORDINAL_SUFFIX, WHITESPACE_RGX
 from scripts.csv_columns import *
 
@@ -53,12 +53,24 @@ STREET_COMPONENTS_RGX = {
     STREET_NUMBER: ORDINAL_RGX
 }
 
+# Text the backtracking-heavy patterns cannot match without. Values lacking it skip the pattern search entirely
+REQUIRED_TEXT_RGX = {
+    BLOCK_RGX: re.compile(r'Blo(?:c)?k\b', flags=re.IGNORECASE),
+    NEIGHBOURHOOD_SUBDISTRICTS_RGX: re.compile(rf'\b{NEIGHBOURHOOD_SUFFIX}\b', flags=re.IGNORECASE)
+}
+
+# Streets without a digit (lane, building, street number) or the above required text cannot match a STREET_COMPONENTS_RGX pattern
+STREET_COMPONENTS_HINT_RGX = re.compile(
+    "|".join([r'\d', *(required.pattern for required in REQUIRED_TEXT_RGX.values())]),
+    flags=re.IGNORECASE
+)
+
 PATTERN_TO_STRING = {
     BLOCK_RGX: "Block Pattern", 
     LANE_RGX: "Lane Pattern", 
     BUILDING_RGX: "Building Code Pattern", 
-    NEIGHBOURHOOD: "Neighbourhood and Subdistricts Pattern", 
-    STREET_NUMBER: "Street Number Pattern"
+    NEIGHBOURHOOD_SUBDISTRICTS_RGX: "Neighbourhood and Subdistricts Pattern", 
+    ORDINAL_RGX: "Street Number Pattern"
 }
 
 def return_final_match(string: str, pattern: re.Pattern) -> Optional[re.Match]:
@@ -67,11 +79,11 @@ def return_final_match(string: str, pattern: re.Pattern) -> Optional[re.Match]:
     return matches[-1] if matches else None
 
 
-def separate_regex_match(value: str, pattern: re.Pattern, reverse: bool = False, trim: bool = True) -> pd.Series:
+def separate_regex_match(value: str, pattern: re.Pattern, reverse: bool = False, trim: bool = True) -> tuple[str, str]:
     """
     Extracts a regex match from a string.
     Returns:
-        pd.Series: A Series with two elements:
+        tuple[str, str]:
             [0] The modified string (with match removed if trim=True),
             [1] The matched substring (or "" if no match is found).
     """
@@ -81,22 +93,23 @@ def separate_regex_match(value: str, pattern: re.Pattern, reverse: bool = False,
     if trim and matched:
         value: str = value.replace(matched, "", 1)
 
-    return pd.Series([value.strip(), matched.strip()])
+    return value.strip(), matched.strip()
 
 NUMBERED_STREETS = {
     "August": "August 23 Street",
     "Commissars": "26 Commissars Street"
 }
 
-def assign_regex_match(row: pd.Series, pattern: re.Pattern, source_column: str, assign_column: str, reverse: bool = False, keep_original: bool = False) -> pd.Series:
+def assign_regex_match(row: pd.Series, pattern: re.Pattern, source_column: str, assign_column: str, reverse: bool = False, keep_original: bool = False) -> tuple:
     """
     Helper to extract a regex match and assign it to the appropriate column.
     Preserves the existing assign-column value. Always trims from the source-column value.
+    Returns the (source_column, assign_column) values, unchanged if separation fails.
     """
     try:
 
         if pd.isna(row[source_column]):
-            return pd.Series({source_column: row[source_column], assign_column: row[assign_column]})
+            return row[source_column], row[assign_column]
         
         value = str(row.get(source_column))
         trimmed, matched = separate_regex_match(value, pattern, reverse)
@@ -112,103 +125,155 @@ def assign_regex_match(row: pd.Series, pattern: re.Pattern, source_column: str,
         if keep_original:
             trimmed = value
 
-        return pd.Series({source_column: trimmed, assign_column: matched})
+        return trimmed, matched
     
     except Exception as e:
-        logging.warning(f"Failed to separate on pattern {PATTERN_TO_STRING[pattern]} for value {value} \n {e}")
+        logging.warning(f"Failed to separate on pattern {PATTERN_TO_STRING.get(pattern, pattern.pattern)} for value {row.get(source_column)} \n {e}")
+        return row.get(source_column), row.get(assign_column)
 
 
-def fix_generic_streets(row: pd.Series) -> pd.Series:
-    '''
-    Fixes cases where the street field is generic (like just 'street') by enriching it with a town or zone name 
-    Removes streets which equal exactly ANY regional value like 'Abovyan'
-    Assumes row values use Pandas "string" dtypes which allow NA values.
-    '''
+def extract_regex_match(values: pd.Series, pattern: re.Pattern, reverse: bool = False) -> pd.Series:
+    """ Vectorized first (or last if reverse) match of a pattern in each string. "" where there is no match. """
+    index = values.index
 
-    if pd.isna(row[STREET]):
-        return row
-    
-    stripped: str = WHITESPACE_RGX.sub(' ', str(row[STREET]))
+    required = REQUIRED_TEXT_RGX.get(pattern)
+    if required is not None:
+        values = values[values.str.contains(required)]
 
-    if not stripped: 
-        return row
+    if values.empty:
+        return pd.Series("", index=index, dtype=object)
 
-    for col in [TOWN, VILLAGE, ADMINISTRATIVE_UNIT, PROVINCE, COUNTRY]:
+    # Wraps the whole pattern in a group so extract returns the full match (verbose patterns may end on a comment)
+    wrapped = f"({pattern.pattern}\n)" if pattern.flags & re.VERBOSE else f"({pattern.pattern})"
+
+    if reverse:
+        matched = values.str.extractall(wrapped, flags=pattern.flags)[0].groupby(level=0).last()
+    else:
+        matched = values.str.extract(wrapped, flags=pattern.flags, expand=True)[0]
+
+    return matched.reindex(index).fillna("").astype(object)
+
+
+def assign_regex_matches(df: DataFrame, pattern: re.Pattern, source_column: str, assign_column: str, reverse: bool = False, keep_original: bool = False, candidates: Optional[pd.Series] = None) -> DataFrame:
+    """
+    Vectorized 'assign_regex_match' over a whole DataFrame, returning the [source_column, assign_column] pair.
+    Preserves the existing assign-column value. Always trims from the source-column value.
+    Only 'candidates' rows (all rows if None) are searched for the pattern; the rest are treated as no match.
+    """
+    result: DataFrame = df.reindex(columns=[source_column, assign_column]).astype(object) # The assign column may not exist yet
+
+    present = df[source_column].notna()
+    values: pd.Series = df.loc[present, source_column].astype(str)
+
+    if candidates is None:
+        matched = extract_regex_match(values, pattern, reverse)
+    else:
+        searched = values[candidates.reindex(values.index, fill_value=False)]
+        matched = extract_regex_match(searched, pattern, reverse).reindex(values.index, fill_value="")
+    # Removes the first occurrence of the matched text, as str.replace(matched, "", 1)
+    trimmed = pd.Series([value.replace(match, "", 1) for value, match in zip(values, matched)], index=values.index, dtype=object).str.strip()
+    matched = matched.str.strip()
+
+    existing = result.loc[present, assign_column]
+    has_existing = existing.notna() & (existing.astype(str).str.strip() != "")
+    matched = existing.astype(object).where(has_existing, matched)
+
+    if assign_column == BUILDING:
+        for name, expanded in NUMBERED_STREETS.items():
+            numbered = trimmed.str.contains(name, regex=False)
+            trimmed = trimmed.mask(numbered, expanded)
+            matched = matched.mask(numbered, "")
+
+    if keep_original:
+        trimmed = values
 
-        if pd.isna(row[col]): 
-            continue
+    result.loc[present, source_column] = trimmed
+    result.loc[present, assign_column] = matched
+    return result
 
-        column_value: str = str(row[col]).strip()
 
-        if not column_value:
-            continue
+def fix_generic_streets(df: DataFrame) -> pd.Series:
+    '''
+    Fixes cases where the street field is generic (like just 'street') by enriching it with a town or zone name 
+    Removes streets which equal exactly ANY regional value like 'Abovyan'
+    Returns the fixed STREET column. Streets are left as-is where every regional value is missing or empty.
+    '''
+    street: pd.Series = df[STREET]
+    present = street.notna()
+    stripped: pd.Series = street[present].astype(str).str.replace(WHITESPACE_RGX, ' ', regex=True)
+    present_index = stripped.index
+
+    matches_region = pd.Series(False, index=present_index)
+    has_region = pd.Series(False, index=present_index)
+    last_region = pd.Series("", index=present_index, dtype=object)
 
-        if stripped == column_value:
-            #logging.debug(f"{value} == {row[col]}")
-            row[STREET] = pd.NA
-            return row
+    for col in [TOWN, VILLAGE, ADMINISTRATIVE_UNIT, PROVINCE, COUNTRY]:
+        column: pd.Series = df.loc[present, col]
+        column_value: pd.Series = column.astype(str).str.strip()
+        valid = column.notna() & (column_value != "")
 
-        if stripped == "Street":
-            row[STREET] = f"{column_value} {stripped}"
+        matches_region |= valid & (stripped == column_value)
+        has_region |= valid
+        last_region = column_value.where(valid, last_region) # 'Street' takes the last regional value as its prefix
 
-        else:
-            row[STREET] = stripped
+    fixed = stripped.where(stripped != "Street", last_region + " " + stripped)
+    fixed = fixed.where(~matches_region, pd.NA)
 
-    return row
+    changed = (stripped != "") & has_region
+    return street.astype(object).mask(present & changed.reindex(street.index, fill_value=False), fixed)
 
 
 def separate_into_unique_components(df: DataFrame) -> DataFrame:
     """Separates BLOCK, LANE, STREET_NUMBER, NEIGHBOURHOOD and BUILDING components from STREET and/or NEIGHBOURHOOD into their own columns using compiled regex patterns."""
-    
+
+    # One scan for any component; streets without one are left untouched by every pass
+    candidates = df[STREET].astype(str).str.contains(STREET_COMPONENTS_HINT_RGX)
+
     for column, pattern in STREET_COMPONENTS_RGX.items():
         reverse_lookup: bool = column == BUILDING
-        df[[STREET, column]] = df.apply(
-            lambda row: assign_regex_match(row, pattern, STREET, column, reverse_lookup),
-            axis=1
-        )
+        df[[STREET, column]] = assign_regex_matches(df, pattern, STREET, column, reverse_lookup, candidates=candidates)
 
-    df[[NEIGHBOURHOOD, BLOCK]] = df.apply(lambda row: assign_regex_match(row, BLOCK_RGX, NEIGHBOURHOOD, BLOCK), axis=1) # Fixed geocoded neighbourhoods being blocks
+    df[[NEIGHBOURHOOD, BLOCK]] = assign_regex_matches(df, BLOCK_RGX, NEIGHBOURHOOD, BLOCK) # Fixed geocoded neighbourhoods being blocks
     
     # Operate on the TRANSLATED column value with the ordinalized Neighbourhood
-    df[[TRANSLATED, BUILDING]] = df.apply(lambda row: assign_regex_match(row, BUILDING_RGX, TRANSLATED, BUILDING, reverse=True, keep_original=True), axis=1) # Fixed missing building codes in geocoded outputs
+    df[[TRANSLATED, BUILDING]] = assign_regex_matches(df, BUILDING_RGX, TRANSLATED, BUILDING, reverse=True, keep_original=True) # Fixed missing building codes in geocoded outputs
 
-    df = df.apply(fix_generic_streets, axis=1)
+    df[STREET] = fix_generic_streets(df)
 
     return df
 
 
-def separate_on_hardcoded_delimiters(row: pd.Series, index_columns: list[str]) -> pd.Series:
+def split_on_delimiter(addresses: pd.Series, delim: str, parts: int) -> DataFrame:
+    """ Splits addresses into at most 'parts' columns on a delimiter. Parts shorter than 3 characters are blanked. """
+    split: DataFrame = addresses.str.split(delim, n=parts - 1, expand=True).reindex(columns=range(parts)).fillna("")
+    split = split.apply(lambda col: col.str.strip())
+    return split.where(split.apply(lambda col: col.str.len()) >= 3, "")
+
+
+def separate_on_hardcoded_delimiters(df: DataFrame, index_columns: list[str]) -> DataFrame:
     """
     Uses "," and "›" delimiters in splitting a TRANSLATED address into 'STREET' and 'TOWN' or reverse if "›"
     Keeps existing values.
     """
-    # If both columns already have values, skip splitting
-    if all(str(row.get(col, "")).strip() for col in index_columns):
-        return pd.Series({col: row.get(col, "") for col in index_columns})
-
-    if address := str(row.get(TRANSLATED, "")):
+    addresses: pd.Series = df[TRANSLATED].fillna("").astype(str)
+    parts = len(index_columns)
 
-        parts = [""] * len(index_columns)
-
-        for delim in [",", "›"]:
-            if delim in address:
-                split_parts = address.split(delim, maxsplit=len(index_columns) - 1)
-                split_parts = [p.strip() if len(p.strip()) >= 3 else "" for p in split_parts]
-                if delim == "›":
-                    split_parts = split_parts[::-1]
-                parts = (split_parts + [""] * len(index_columns))[:len(index_columns)]
-                break
-
-        # Preserve any existing non-empty values
-        for i, col in enumerate(index_columns):
-            if str(row.get(col, "")).strip():
-                parts[i] = row[col]
-
-        return pd.Series(dict(zip(index_columns, parts)))
+    # "," takes precedence over "›" when both are present
+    comma = addresses.str.contains(",", regex=False)
+    chevron = ~comma & addresses.str.contains("›", regex=False)
 
+    # Each delimiter only splits its own rows; every other row is left as ""
+    comma_parts = split_on_delimiter(addresses[comma], ",", parts).reindex(addresses.index, fill_value="")
+    chevron_parts = split_on_delimiter(addresses[chevron], "›", parts).reindex(addresses.index, fill_value="")
 
+    separated = DataFrame(index=df.index)
 
+    for i, col in enumerate(index_columns):
+        split_value = comma_parts[i].where(comma, chevron_parts[parts - 1 - i]) # "›" parts are reversed
+        has_value = df[col].astype(str).str.strip() != "" # Preserve any existing non-empty values
+        separated[col] = df[col].where(has_value, split_value)
 
+    return separated
 
 
 def separate_hardcoded_regional_labels(df: pd.DataFrame) -> pd.DataFrame:
@@ -218,54 +283,42 @@ def separate_hardcoded_regional_labels(df: pd.DataFrame) -> pd.DataFrame:
     provinces, administrative_units_mapping, locality_mapping = retrieve_armenian_regional_structure()
 
     # Initial fuzzy match to Province
-    df["_province_guess"] = df.apply(
-        lambda row: fuzzy_match(row[TRANSLATED], choices=provinces), axis=1
-    )
+    df["_province_guess"] = fuzzy_match_series(df[TRANSLATED], choices=provinces)
 
     # Preserve existing Province entries if present
-    df[PROVINCE] = df.apply(
-        lambda row: row[PROVINCE] if str(row[PROVINCE]) else row["_province_guess"], axis=1
-    )
+    df[PROVINCE] = df[PROVINCE].where(df[PROVINCE].astype(str) != "", df["_province_guess"])
 
     # Fuzzy match to possible admin unit (but do not yet commit it)
-    df["_admin_guess"] = df.apply(
-        lambda row: fuzzy_match(row[TRANSLATED], choices=administrative_units_mapping.keys()) 
-        if not str(row[ADMINISTRATIVE_UNIT]).strip() else row[ADMINISTRATIVE_UNIT], axis=1
-    )
+    admin_missing = df[ADMINISTRATIVE_UNIT].astype(str).str.strip() == ""
+    df["_admin_guess"] = df[ADMINISTRATIVE_UNIT].astype(object)
+    df.loc[admin_missing, "_admin_guess"] = fuzzy_match_series(df.loc[admin_missing, TRANSLATED], choices=administrative_units_mapping.keys())
 
     # Validate guessed admin unit against mapped Province
-    df["_admin_validated"] = df.apply(
-        lambda row: row["_admin_guess"] if administrative_units_mapping.get(row["_admin_guess"]) == row[PROVINCE] else "", axis=1
-    )
-
-    # Commit validated or existing admin unit
-    df[ADMINISTRATIVE_UNIT] = df.apply(
-        lambda row: row[ADMINISTRATIVE_UNIT] if row[ADMINISTRATIVE_UNIT] else row["_admin_validated"], axis=1
-    )
+    df["_admin_validated"] = [
+        guess if administrative_units_mapping.get(guess) == province else ""
+        for guess, province in zip(df["_admin_guess"], df[PROVINCE])
+    ]
 
+    # Commit validated or existing admin unit (truthiness as in 'if value', so NaN counts as present)
+    df[ADMINISTRATIVE_UNIT] = df[ADMINISTRATIVE_UNIT].where(df[ADMINISTRATIVE_UNIT].astype(bool), df["_admin_validated"])
 
-    # Attempts to backfill if missing
 
-    df[PROVINCE] = df.apply(
-        lambda row: reverse_lookup(row[ADMINISTRATIVE_UNIT], administrative_units_mapping)
-        if not str(row[PROVINCE]).strip() else row[PROVINCE], axis=1
-    )
+    # Attempts to backfill if missing (reverse lookups are dictionary maps defaulting to "")
 
-    df[ADMINISTRATIVE_UNIT] = df.apply(
-        lambda row: reverse_lookup(row[TOWN] or row[VILLAGE], locality_mapping)
-        if not row[ADMINISTRATIVE_UNIT] and (row[TOWN] or row[VILLAGE])
-        else row[ADMINISTRATIVE_UNIT],
-        axis=1
-    )
+    province_missing = df[PROVINCE].astype(str).str.strip() == ""
+    df[PROVINCE] = df[PROVINCE].where(~province_missing, df[ADMINISTRATIVE_UNIT].map(administrative_units_mapping).fillna(""))
 
-    def get_first_valid_admin(series: pd.Series) -> str:
-        valid_entries = series.dropna().loc[lambda s: s.str.strip() != ""]
-        return valid_entries.iloc[0] if not valid_entries.empty else pd.NA
+    settlement = df[TOWN].where(df[TOWN].astype(bool), df[VILLAGE]) # TOWN or VILLAGE
+    admin_backfill = ~df[ADMINISTRATIVE_UNIT].astype(bool) & settlement.astype(bool)
+    df[ADMINISTRATIVE_UNIT] = df[ADMINISTRATIVE_UNIT].where(~admin_backfill, settlement.map(locality_mapping).fillna(""))
 
-    # Step 1: Compute first valid administrative unit for each (Province, Street) group
+    # Step 1: Compute first valid administrative unit for each (Province, Street) group ('first' skips the masked empty entries)
+    admin_valid = df[ADMINISTRATIVE_UNIT].notna() & (df[ADMINISTRATIVE_UNIT].astype(str).str.strip() != "")
     admin_unit_lookup = (
-        df.groupby([PROVINCE, STREET])[ADMINISTRATIVE_UNIT]
-        .apply(get_first_valid_admin)
+        df[ADMINISTRATIVE_UNIT].where(admin_valid)
+        .groupby([df[PROVINCE], df[STREET]])
+        .first()
+        .fillna(pd.NA)
         .rename("GROUP_ADMIN_UNIT")
         .reset_index()
     )
@@ -274,12 +327,8 @@ def separate_hardcoded_regional_labels(df: pd.DataFrame) -> pd.DataFrame:
     df = df.merge(admin_unit_lookup, on=[PROVINCE, STREET], how="left")
 
     # Step 3: Only fill missing or empty admin units
-    df[ADMINISTRATIVE_UNIT] = df.apply(
-        lambda row: row["GROUP_ADMIN_UNIT"]
-        if pd.isna(row[ADMINISTRATIVE_UNIT]) or str(row[ADMINISTRATIVE_UNIT]).strip() == ""
-        else row[ADMINISTRATIVE_UNIT],
-        axis=1
-    )
+    admin_empty = df[ADMINISTRATIVE_UNIT].isna() | (df[ADMINISTRATIVE_UNIT].astype(str).str.strip() == "")
+    df[ADMINISTRATIVE_UNIT] = df[ADMINISTRATIVE_UNIT].where(~admin_empty, df["GROUP_ADMIN_UNIT"])
 
     df.drop(columns=["GROUP_ADMIN_UNIT"], inplace=True)
 
@@ -1,10 +1,23 @@
+import numpy as np
 import pandas as pd
-from scripts.csv_columns import LATITUDE, LONGITUDE
-from geopy.distance import great_circle
+from geopy.distance import EARTH_RADIUS
+from scripts.csv_columns import ADMINISTRATIVE_UNIT, NEIGHBOURHOOD, PROVINCE, STREET, TOWN
 
 YEREVAN_CENTRE = (40.1792, 44.4991)
 
-def compute_distance(row: pd.Series) -> float:
-    return great_circle((row[LATITUDE], row[LONGITUDE]), YEREVAN_CENTRE).km
+ADDRESS_COLUMNS: list[str] = [STREET, TOWN, NEIGHBOURHOOD, ADMINISTRATIVE_UNIT, PROVINCE]
 
+def distances_from_point(latitudes: np.ndarray, longitudes: np.ndarray, centre: tuple[float, float]) -> np.ndarray:
+    ''' Great-circle distances in km from each coordinate to a single (latitude, longitude) point (haversine) '''
+    lat, lon = np.radians(latitudes), np.radians(longitudes)
+    lat0, lon0 = np.radians(centre)
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * np.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
 
+def distances_to_yerevan(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    ''' Great-circle distances in km from each coordinate to the centre of Yerevan '''
+    return distances_from_point(latitudes, longitudes, YEREVAN_CENTRE)
+
+def categorize_address_columns(df: pd.DataFrame) -> pd.DataFrame:
+    ''' Casts the repeated address values to 'category' so groupby / merge operate on integer codes. Cast after concatenating datasets. '''
+    return df.astype({col: 'category' for col in ADDRESS_COLUMNS if col in df.columns})
@@ -1,94 +1,77 @@
 import logging
 import numpy as np
 import pandas as pd
-import seaborn as sns
 import matplotlib.pyplot as plt
 import plotly.io as pio
 import seaborn as sns
-from scipy.stats import spearmanr, norm, pointbiserialr
+from scipy.stats import norm, rankdata, t as t_dist
 from scripts.csv_columns import *
 
 pio.renderers.default = 'browser' 
 
 def correlation_ci(r, n, alpha=0.05):
     """Calculate 95% confidence intervals using Fisher Z-transform"""
-    if n <= 3 or abs(r) == 1.0:
-        return np.nan, np.nan
-    z = 0.5 * np.log((1 + r) / (1 - r))
-    se = 1 / np.sqrt(n - 3)
+    r, n = np.asarray(r, dtype=float), np.asarray(n)
+    valid = (n > 3) & (np.abs(r) != 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.arctanh(np.where(valid, r, 0.0))
+        se = 1 / np.sqrt(np.where(valid, n - 3, 1))
     z_crit = norm.ppf(1 - alpha / 2)
-    ci_low = np.tanh(z - z_crit * se)
-    ci_high = np.tanh(z + z_crit * se)
+    ci_low = np.where(valid, np.tanh(z - z_crit * se), np.nan)
+    ci_high = np.where(valid, np.tanh(z + z_crit * se), np.nan)
     return ci_low, ci_high
 
 def significance_label(p):
-    if p < 0.001:
-        return "P < 0.001"
-    elif p < 0.01:
-        return "P < 0.01"
-    elif p < 0.05:
-        return "P < 0.05"
-    else:
-        return ""
+    p = np.asarray(p, dtype=float)
+    return np.select([p < 0.001, p < 0.01, p < 0.05], ["P < 0.001", "P < 0.01", "P < 0.05"], default="")
 
 def effect_strength_label(r):
-    if abs(r) >= 0.6:
-        return "Strong"
-    elif abs(r) >= 0.3:
-        return "Moderate"
-    elif abs(r) > 0:
-        return "Weak"
-    else:
-        return ""
+    r = np.abs(np.asarray(r, dtype=float))
+    return np.select([r >= 0.6, r >= 0.3, r > 0], ["Strong", "Moderate", "Weak"], default="")
+
+def correlation_pvalues(corr: np.ndarray, n: int) -> np.ndarray:
+    """Two-sided p-values for correlation coefficients from the t-distribution with n - 2 degrees of freedom"""
+    dof = n - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_stat = corr * np.sqrt(dof / ((1.0 - corr) * (1.0 + corr)))
+    return np.where(np.abs(corr) == 1.0, 0.0, 2 * t_dist.sf(np.abs(t_stat), dof))
 
 def draw_correlation_matrix(column_series: pd.DataFrame, binary_columns: list = []):
     columns = column_series.columns
-    corr_matrix = pd.DataFrame(np.eye(len(columns)), index=columns, columns=columns)
-    pval_matrix = pd.DataFrame(np.zeros_like(corr_matrix), index=columns, columns=columns)
-
-    for row in columns:
-        for col in columns:
-            if row == col:
-                continue
-
-            x = column_series[row]
-            y = column_series[col]
-            n_obs = min(x.dropna().shape[0], y.dropna().shape[0])
-            try:
-                is_binary = row in binary_columns or col in binary_columns
-                if is_binary:
-                    corr, pval = pointbiserialr(x, y)
-                    method = "point biserial"
-                else:
-                    corr, pval = spearmanr(x, y)
-                    method = "spearman"
-
-                corr_matrix.loc[row, col] = corr
-                pval_matrix.loc[row, col] = pval
-                ci_low, ci_high = correlation_ci(corr, n_obs)
-
-                logging.info(f"{method.title()} Correlation between {row} and {col}: "
-                             f"r = {corr:.4f}, p = {pval:.2e}, CI = [{ci_low:.2f}, {ci_high:.2f}]")
-
-            except Exception as e:
-                logging.warning(f"Error comparing {row} and {col}: {e}")
-                corr_matrix.loc[row, col] = np.nan
-                pval_matrix.loc[row, col] = np.nan
-
-    labels = pd.DataFrame("", index=columns, columns=columns)
-    for row in columns:
-        for col in columns:
-            r = corr_matrix.loc[row, col]
-            p = pval_matrix.loc[row, col]
-            if row == col:
-                labels.loc[row, col] = "1.00"
-            elif pd.isna(r):
-                labels.loc[row, col] = "NaN"
-            else:
-                r_str = f"{r:.2f}"
-                p_str = significance_label(p)
-                e_str = effect_strength_label(r)
-                labels.loc[row, col] = f"{r_str}\n{p_str}\n{e_str}"
+    values = column_series.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    n = values.shape[0]
+
+    # Point biserial is Pearson on the raw values; Spearman is Pearson on the ranks.
+    # Missing values propagate to NaN coefficients as they do in scipy.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pearson = np.corrcoef(values, rowvar=False)
+        spearman = np.corrcoef(rankdata(values, axis=0), rowvar=False)
+
+    is_binary = columns.isin(binary_columns)
+    binary_pairs = is_binary[:, None] | is_binary[None, :]
+    corr = np.where(binary_pairs, pearson, spearman)
+    corr = np.clip(corr, -1.0, 1.0)
+    np.fill_diagonal(corr, 1.0)
+
+    pval = correlation_pvalues(corr, n)
+    np.fill_diagonal(pval, 0.0)
+
+    counts = column_series.notna().sum().to_numpy()
+    n_obs = np.minimum(counts[:, None], counts[None, :])
+    ci_low, ci_high = correlation_ci(corr, n_obs)
+
+    for i, j in zip(*np.nonzero(~np.eye(len(columns), dtype=bool))):
+        method = "point biserial" if binary_pairs[i, j] else "spearman"
+        logging.info(f"{method.title()} Correlation between {columns[i]} and {columns[j]}: "
+                     f"r = {corr[i, j]:.4f}, p = {pval[i, j]:.2e}, CI = [{ci_low[i, j]:.2f}, {ci_high[i, j]:.2f}]")
+
+    r_str = np.char.mod("%.2f", corr)
+    annotations = np.char.add(np.char.add(np.char.add(r_str, "\n"), np.char.add(significance_label(pval), "\n")), effect_strength_label(corr))
+    annotations = np.where(np.isnan(corr), "NaN", annotations)
+    np.fill_diagonal(annotations, "1.00")
+
+    corr_matrix = pd.DataFrame(corr, index=columns, columns=columns)
+    labels = pd.DataFrame(annotations, index=columns, columns=columns)
 
     # Plot heatmap
     plt.figure(figsize=(8, 6))
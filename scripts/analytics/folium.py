@@ -4,6 +4,8 @@ from pathlib import Path
 from scripts.csv_columns import *
 from folium.plugins import HeatMap
 
+HEATMAP_GRID_DEGREES: float = 0.001 # ~100 m, a few pixels at the initial zoom. Listings in the same cell are summed into one point
+
 
 def rental_rates_density_map(df: pd.DataFrame):
 
@@ -12,7 +14,15 @@ def rental_rates_density_map(df: pd.DataFrame):
     df[[LATITUDE, LONGITUDE, MONTHLY_USD_PRICE]] = df[[LATITUDE, LONGITUDE, MONTHLY_USD_PRICE]].apply(pd.to_numeric, errors='coerce')
     df = df.dropna(subset=[LATITUDE, LONGITUDE, MONTHLY_USD_PRICE])
 
-    data_series: list[list[float]] = df[[LATITUDE, LONGITUDE, MONTHLY_USD_PRICE]].values.tolist()
+    # Bins listings onto a coarse grid (many share geocoded street coordinates) so far fewer points are written to the HTML
+    binned: pd.DataFrame = (
+        df[[LATITUDE, LONGITUDE]].div(HEATMAP_GRID_DEGREES).round().mul(HEATMAP_GRID_DEGREES)
+        .assign(**{MONTHLY_USD_PRICE: df[MONTHLY_USD_PRICE]})
+        .groupby([LATITUDE, LONGITUDE], sort=False)[MONTHLY_USD_PRICE].sum()
+        .reset_index()
+    )
+
+    data_series: list[list[float]] = binned.to_numpy().tolist()
 
     filepath = Path("Rental Rate Density.html")
 
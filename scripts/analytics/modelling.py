@@ -1,15 +1,14 @@
 import logging
 import re
-from typing import Union
+from typing import Optional
 import pandas as pd
 import numpy as np
-import scipy
 import shap
 from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
-from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
 from sklearn.compose import ColumnTransformer
+from scripts.analytics import categorize_address_columns
 from scripts.analytics.evaluation import evaluate_predictions
 from scripts.analytics.visual import visualize_explained_variance, visualize_pca_clusters, visualize_prediction_errors
 from scripts.csv_columns import *
@@ -18,6 +17,7 @@ from scripts.csv_columns import *
 
 CLUSTERS: int = 3
 PCA_N: int = 3
+MAX_CATEGORIES: int = 255 # Native categorical splits allow at most 'max_bins' (255) categories per feature; infrequent values share one
 SHAPLEY_ADDITIVE_EXPLANATIONS = True
 
 NUMERIC_COLUMNS: list[str] = [DURATION, APPLIANCES_RANK, AMENITIES_RANK]
@@ -45,6 +45,17 @@ def build_preprocessor() -> ColumnTransformer:
         ("num", StandardScaler(), NUMERIC_COLUMNS)
     ])
 
+def build_regressor_preprocessor() -> ColumnTransformer:
+    """
+    Builds a preprocessing pipeline for the gradient boosting regressor:
+    - Ordinal encodes categorical variables for native categorical splits (unknown values are treated as missing)
+    - Passes numeric variables through (tree splits are scale-invariant)
+    """
+    return ColumnTransformer([
+        ("cat", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1, max_categories=MAX_CATEGORIES), CATEGORICAL_COLUMNS),
+        ("num", "passthrough", NUMERIC_COLUMNS)
+    ], verbose_feature_names_out=False)
+
 # ---------------------- Clustering ----------------------
 
 def cluster_with_principle_components(df: pd.DataFrame, preprocessor: ColumnTransformer, n_clusters: int = CLUSTERS) -> tuple[pd.DataFrame, np.ndarray, np.ndarray]:
@@ -53,17 +64,16 @@ def cluster_with_principle_components(df: pd.DataFrame, preprocessor: ColumnTran
     Adds cluster labels to the DataFrame
     """
     X = df[CATEGORICAL_COLUMNS + NUMERIC_COLUMNS]
-    X = preprocessor.transform(X)
+    X = preprocessor.transform(X).astype(np.float32) # Single precision halves the matrix for PCA and KMeans; cluster labels are unchanged
 
-    visualize_explained_variance(X)
+    pca = visualize_explained_variance(X)
+    X = pca.transform(X)[:, :PCA_N] # Leading components of the full fit match a PCA_N component fit
 
-    pca = PCA(n_components=PCA_N)
-    X = pca.fit_transform(X)
 
     kmeans = KMeans(n_clusters=n_clusters, random_state=42)
     labels = kmeans.fit_predict(X)
 
-    visualize_pca_clusters(X, labels)
+    visualize_pca_clusters(X, labels, pca)
 
     df["Cluster"] = labels
 
@@ -73,9 +83,10 @@ def cluster_with_principle_components(df: pd.DataFrame, preprocessor: ColumnTran
 
 # ---------------------- Modeling ----------------------
 
-def train_random_regressor(df: pd.DataFrame, description: str) -> tuple[ColumnTransformer, RandomForestRegressor]:
+def train_random_regressor(df: pd.DataFrame, description: str, preprocessor: Optional[ColumnTransformer] = None) -> tuple[ColumnTransformer, HistGradientBoostingRegressor]:
     """
     Fits a HistGradientBoostingRegressor to the given DataFrame.
+    Reuses an already fitted preprocessor if given, otherwise fits one on the DataFrame.
     Returns the fitted preprocessor and the model.
     """
     if df.empty:
@@ -84,32 +95,34 @@ def train_random_regressor(df: pd.DataFrame, description: str) -> tuple[ColumnTr
     X = df[CATEGORICAL_COLUMNS + NUMERIC_COLUMNS]
     y = df[MONTHLY_USD_PRICE]
 
-    preprocessor: ColumnTransformer = build_preprocessor()
-    X_processed: Union[np.ndarray, scipy.sparse.spmatrix] = preprocessor.fit_transform(X)
+    if preprocessor is None:
+        preprocessor = build_regressor_preprocessor().fit(X)
 
-    if hasattr(X_processed, "toarray"):
-        X_processed = X_processed.toarray()
+    X_processed: np.ndarray = preprocessor.transform(X)
 
-    model = HistGradientBoostingRegressor(max_iter=200, learning_rate=0.1)
+    categorical_features = list(range(len(CATEGORICAL_COLUMNS))) # Encoded categoricals lead the transformed columns
+    model = HistGradientBoostingRegressor(max_iter=200, learning_rate=0.1, categorical_features=categorical_features)
     model.fit(X_processed, y)
 
     logging.info(f"{description} model trained on {len(df)} rows")
     return preprocessor, model
 
 
-def train_cluster_models(train_df: pd.DataFrame) -> dict[int, tuple[ColumnTransformer, RandomForestRegressor]]:
+def train_cluster_models(train_df: pd.DataFrame) -> dict[int, tuple[ColumnTransformer, HistGradientBoostingRegressor]]:
+    # Fitted once on the whole training set so every cluster model shares the same category codes
+    preprocessor: ColumnTransformer = build_regressor_preprocessor().fit(train_df[CATEGORICAL_COLUMNS + NUMERIC_COLUMNS])
     cluster_models = {}
     for cluster_id in train_df["Cluster"].unique():
         cluster_df = train_df[train_df["Cluster"] == cluster_id]
         if not cluster_df.empty:
-            preprocessor, model = train_random_regressor(cluster_df, f"Cluster {cluster_id}")
+            preprocessor, model = train_random_regressor(cluster_df, f"Cluster {cluster_id}", preprocessor)
             cluster_models[cluster_id] = (preprocessor, model)
     return cluster_models
 
 
 # ---------------------- Prediction ----------------------
 
-def prediction(df: pd.DataFrame, preprocessor: ColumnTransformer, model: RandomForestRegressor, model_name: str) -> pd.Series:
+def prediction(df: pd.DataFrame, preprocessor: ColumnTransformer, model: HistGradientBoostingRegressor, model_name: str) -> pd.Series:
     """
     Runs prediction on the DataFrame using the trained model.
     """
@@ -120,7 +133,7 @@ def prediction(df: pd.DataFrame, preprocessor: ColumnTransformer, model: RandomF
     return model.predict(preprocessor.transform(X))
 
 
-def make_predictions_by_cluster(test_df: pd.DataFrame, cluster_models: dict[int, tuple[ColumnTransformer, RandomForestRegressor]]) -> pd.DataFrame:
+def make_predictions_by_cluster(test_df: pd.DataFrame, cluster_models: dict[int, tuple[ColumnTransformer, HistGradientBoostingRegressor]]) -> pd.DataFrame:
 
     explained: bool = False # Run once because PermutationExplainer takes a while to run
 
@@ -134,9 +147,6 @@ def make_predictions_by_cluster(test_df: pd.DataFrame, cluster_models: dict[int,
         # Preprocess columns with preprocessor
         X_processed = preprocessor.transform(cluster_rows[CATEGORICAL_COLUMNS + NUMERIC_COLUMNS])
 
-        if hasattr(X_processed, "toarray"): # Casts to a dense numpty array for HistGradientBoostingRegressor
-            X_processed = X_processed.toarray()
-
         # Run a prediction
         preds = model.predict(X_processed)
         test_df.loc[test_df["Cluster"] == cluster_id, "Predicted"] = preds.round(2)
@@ -145,7 +155,7 @@ def make_predictions_by_cluster(test_df: pd.DataFrame, cluster_models: dict[int,
 
             names = [clean_shapley_label(name) for name in preprocessor.get_feature_names_out()]
 
-            # SHAP Explanations (XAI)
+            # SHAP Explanations (XAI). Model-agnostic as TreeExplainer ignores the regressor's categorical splits
             explainer = shap.Explainer(model.predict, X_processed, feature_names=names)
             shap_values = explainer(X_processed)
 
@@ -193,6 +203,7 @@ if __name__ == "__main__":
     # Load and prepare full dataset
     df1, df2, _ = load()
     df = pd.concat([df1, df2], ignore_index=True)
+    df = categorize_address_columns(df)
 
     df[DURATION] = df[DURATION] == "Monthly"
 
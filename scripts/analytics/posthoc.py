@@ -1,16 +1,26 @@
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import scikit_posthocs as sp
 import plotly.io as pio
-from pingouin import compute_effsize
-from itertools import combinations
 from matplotlib import pyplot as plt
 
 pio.renderers.default = 'browser' # Non-Jupyter Rendering
 
+def cohens_d(mean1: float, var1: float, n1: int, mean2: float, var2: float, n2: int) -> float:
+    ''' Cohen's d of two independent samples from their means, unbiased variances and sizes (pooled standard deviation) '''
+    with np.errstate(divide='ignore', invalid='ignore'): # Accepts arrays of group statistics
+        pooled_sd = np.sqrt(((n1 - 1) * var1 + (n2 - 1) * var2) / (n1 + n2 - 2))
+        sd = np.where(n2 == 1, np.sqrt(var1), pooled_sd) # One-sample case, as in pingouin.compute_effsize
+        return (mean1 - mean2) / sd
+
 def dunn_posthoc(df: pd.DataFrame, value_col: str, col1: str, col2: str):
 
-    df["FurnBal"] = df[col1].astype(str) + "_" + df[col2].astype(str)
+    # Integer code per (col1, col2) pair, numbered by first appearance; labels are only built once per pair
+    codes = df.groupby([col1, col2], sort=False, dropna=False, observed=True).ngroup()
+    first = ~codes.duplicated()
+    labels = (df.loc[first, col1].astype(str) + "_" + df.loc[first, col2].astype(str)).to_numpy()
+    df["FurnBal"] = labels[codes.to_numpy()]
 
     # Run PostHoc Analysis
     posthoc = sp.posthoc_dunn(
@@ -21,30 +31,27 @@ def dunn_posthoc(df: pd.DataFrame, value_col: str, col1: str, col2: str):
     )
 
     # p-values with significance levels
-    def p_to_label(p):
-        if p < 0.001:
-            return "P < 0.001\nVERY SIGNIFICANT"
-        elif p < 0.01:
-            return "P < 0.01"
-        elif p < 0.05:
-            return "P < 0.05"
-        else:
-            return "NOT SIGNIFICANT"
-
-    annotations = posthoc.copy().astype(str)
-
-    testing_combinations = list(combinations(df["FurnBal"].unique(), 2))
-
-    for g1, g2 in testing_combinations:
-        group1 = df[df["FurnBal"] == g1][value_col]
-        group2 = df[df["FurnBal"] == g2][value_col]
-        d = compute_effsize(group1, group2, eftype='cohen')  # EFFECT SIZE
-        
-        pval = posthoc.loc[g1, g2]
-        label = f"{p_to_label(pval)}\nd={d:.3f}"
-        
-        annotations.loc[g1, g2] = label
-        annotations.loc[g2, g1] = label
+    p = posthoc.to_numpy(dtype=float)
+    p_labels = np.select(
+        [p < 0.001, p < 0.01, p < 0.05],
+        ["P < 0.001\nVERY SIGNIFICANT", "P < 0.01", "P < 0.05"],
+        default="NOT SIGNIFICANT"
+    )
+
+    # Group statistics are computed once; missing values are excluded as in pingouin.compute_effsize
+    grouped = df.groupby("FurnBal", sort=False)[value_col]
+    stats = pd.DataFrame({"mean": grouped.mean(), "var": grouped.var(ddof=1), "n": grouped.count()})
+    stats["first_seen"] = np.arange(len(stats)) # Each pair is compared with its earlier seen group first
+    mean, var, n, first_seen = (stats.reindex(posthoc.index)[c].to_numpy(dtype=float) for c in stats.columns)
+
+    rows, cols = np.indices(p.shape)
+    earlier = first_seen[rows] < first_seen[cols]
+    g1, g2 = np.where(earlier, rows, cols), np.where(earlier, cols, rows)
+    d = cohens_d(mean[g1], var[g1], n[g1], mean[g2], var[g2], n[g2])  # EFFECT SIZE
+
+    annotations = np.char.add(p_labels, np.char.mod("\nd=%.3f", d)).astype(object)
+    np.fill_diagonal(annotations, posthoc.astype(str).to_numpy().diagonal())
+    annotations = pd.DataFrame(annotations, index=posthoc.index, columns=posthoc.columns)
 
     sns.heatmap(posthoc.astype(float), annot=annotations, fmt="", cmap="coolwarm", cbar_kws={"label": "p-value"})
     plt.title("Dunn Significance & Cohen's d: USD Price by [Furniture, Balcony]")
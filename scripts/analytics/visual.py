@@ -1,15 +1,13 @@
 
 import logging
 import seaborn as sns
-import operator
 import numpy as np
 import pandas as pd
 import plotly.io as pio
 import plotly.express as px
 import plotly.graph_objects as go
-from functools import reduce
 from sklearn.decomposition import PCA
-from scripts.analytics import compute_distance
+from scripts.analytics import categorize_address_columns, distances_to_yerevan
 from scripts.analytics.correlation import draw_correlation_matrix
 from scripts.csv_columns import *
 from typing import Optional
@@ -18,12 +16,15 @@ from enum import Enum, auto
 from scipy.stats import pointbiserialr, pearsonr, spearmanr
 
 
-def visualize_explained_variance(X_proc: np.ndarray) -> None:
+def visualize_explained_variance(X_proc: np.ndarray) -> PCA:
     """
     Plots cumulative explained variance to help choose the optimal number of PCA components.
     Avoid blindly inflating PCA components as might not significantly improve performance beyond a certain level.
+    Returns the fitted PCA so callers can project onto its leading components without refitting.
     """
-    pca = PCA()
+    # Eigendecomposition of the feature covariance: accepts the sparse one-hot matrix and
+    # costs O(n·p² + p³) rather than densifying it for a full SVD over every sample
+    pca = PCA(svd_solver="covariance_eigh")
     pca.fit(X_proc)
 
     cum_var = np.cumsum(pca.explained_variance_ratio_)
@@ -38,18 +39,22 @@ def visualize_explained_variance(X_proc: np.ndarray) -> None:
     plt.tight_layout()
     plt.show()
 
+    return pca
 
-def visualize_pca_clusters(X_pca: np.ndarray, labels: np.ndarray) -> None:
+
+def visualize_pca_clusters(X_pca: np.ndarray, labels: np.ndarray, pca: Optional[PCA] = None) -> None:
     """
     Visualizes clusters in 2D PCA space.
+    Labels each axis with its share of explained variance when the fitted PCA is given.
     """
+    ratios = pca.explained_variance_ratio_ if pca is not None else None
     plt.figure(figsize=(10, 6))
     for cluster_id in np.unique(labels):
         idx = labels == cluster_id
         plt.scatter(X_pca[idx, 0], X_pca[idx, 1], label=f"Cluster {cluster_id}", alpha=0.6)
     plt.title("PCA-reduced Clusters")
-    plt.xlabel("PCA Component 1")
-    plt.ylabel("PCA Component 2")
+    plt.xlabel("PCA Component 1" + (f" ({ratios[0]:.1%})" if ratios is not None else ""))
+    plt.ylabel("PCA Component 2" + (f" ({ratios[1]:.1%})" if ratios is not None else ""))
     plt.legend()
     plt.grid(True)
     plt.show()
@@ -98,22 +103,18 @@ def draw_box_plots(df: pd.DataFrame, column_x: str, column_y: str, biserial: boo
     plt.show()
 
 
-def compute_change(series: pd.Series, method: ChangeMethod) -> float:
-    f = pd.to_numeric(series.iloc[0], errors="coerce")
-    l = pd.to_numeric(series.iloc[-1], errors="coerce")
-    match method:
-        case ChangeMethod.ABSOLUTE:
-            return l - f
-        case ChangeMethod.PERCENT:
-            return np.nan if f == 0 else (l - f) / f
-        case ChangeMethod.LOG:
-            return np.nan if f <= 0 or l <= 0 else np.log(l / f)
-        case ChangeMethod.MEAN:
-            return series.mean()
-        case ChangeMethod.MEDIAN:
-            return series.median()
-        case _:
-            raise ValueError(f"Invalid ChangeMethod: {method}")
+def compute_changes(f: np.ndarray, l: np.ndarray, method: ChangeMethod) -> np.ndarray:
+    ''' Change between arrays of each subgroup's first and last values '''
+    with np.errstate(divide="ignore", invalid="ignore"):
+        match method:
+            case ChangeMethod.ABSOLUTE:
+                return l - f
+            case ChangeMethod.PERCENT:
+                return np.where(f == 0, np.nan, (l - f) / f)
+            case ChangeMethod.LOG:
+                return np.where((f <= 0) | (l <= 0), np.nan, np.log(l / f))
+            case _:
+                raise ValueError(f"Invalid ChangeMethod for first / last change: {method}")
 
 
 def compute_group_changes(df: pd.DataFrame, method: ChangeMethod, group_columns: list[str]) -> pd.DataFrame:
@@ -123,18 +124,23 @@ def compute_group_changes(df: pd.DataFrame, method: ChangeMethod, group_columns:
         logging.info("Computing Aggregate Average Stats")
         changes = (
             # Ignore street level subgroups. Use point-level distribution
-            df.groupby(group_columns, observed=True)[MONTHLY_USD_PRICE]
-            .agg([agg_type, "std", "count"])
+            df.groupby(group_columns, observed=True, sort=False)[MONTHLY_USD_PRICE]
+            .agg(**{PRICE_CHANGE: agg_type, "StdDev": "std", "Count": "count"})
             .reset_index()
-            .rename(columns={agg_type: PRICE_CHANGE, "std": "StdDev", "count": "Count"})
         )
     else:
         # Otherwise compute the chronological change within STREET subgroups and aggregate upwards
-        changes = (
-            df.groupby(group_columns + [STREET], observed=True)
-            .apply(lambda group: compute_change(group.sort_values(DATE)[MONTHLY_USD_PRICE], method))
-            .reset_index(name=PRICE_CHANGE)
-        )
+        subgroup_columns = group_columns + [STREET]
+        df_sorted = df.sort_values(subgroup_columns + [DATE], kind="stable").reset_index(drop=True) # One sort instead of one per subgroup
+        prices = df_sorted.groupby(subgroup_columns, observed=True, sort=False)[MONTHLY_USD_PRICE]
+
+        # Positional first / last rows of each subgroup (unlike 'first' / 'last', missing prices are not skipped)
+        first_rows, last_rows = prices.nth(0), prices.nth(-1)
+        f = pd.to_numeric(first_rows, errors="coerce").to_numpy(dtype=float)
+        l = pd.to_numeric(last_rows, errors="coerce").to_numpy(dtype=float)
+
+        changes = df_sorted.loc[first_rows.index, subgroup_columns].reset_index(drop=True)
+        changes[PRICE_CHANGE] = compute_changes(f, l, method)
     return changes
 
 
@@ -144,26 +150,19 @@ def get_representative_samples(
     max_per_group: int | None = None,
     min_required: int = 0
 ) -> pd.DataFrame:
-    samples = []
-    for keys, group in df.groupby(group_cols, observed=True):
-
-        if len(group) < min_required:
-            continue  # skip undersized groups
-
-        # Sample if max_per_group
-        if max_per_group is not None:
-            group = group.sample(n=min(len(group), max_per_group), random_state=42)
-
-        # Reattach
-        if isinstance(keys, tuple):
-            for col, val in zip(group_cols, keys):
-                group[col] = val
-        else:
-            group[group_cols[0]] = keys
+    '''
+    Keeps groups with at least 'min_required' rows, sampling at most 'max_per_group' rows from each.
+    Rows are ordered by group key, then by draw.
+    '''
+    df = df[df.groupby(group_cols, observed=True).transform('size') >= min_required] # Missing keys have no size and are dropped
+    grouped = df.groupby(group_cols, observed=True)
 
-        samples.append(group)
+    if max_per_group is not None:
+        # Shuffles each group, then keeps its first 'max_per_group' draws
+        sampled = grouped.sample(frac=1, random_state=42)
+        return sampled.groupby(group_cols, observed=True).head(max_per_group).reset_index(drop=True)
 
-    return pd.concat(samples, ignore_index=True)
+    return df.iloc[grouped.ngroup().argsort(kind='stable').to_numpy()].reset_index(drop=True)
 
 
 def build_hover_data(df: pd.DataFrame, change_type: str, group_columns: list[str]) -> dict:
@@ -190,8 +189,7 @@ def build_bar_plots(df, x_axis, y_col, label, hover_data, change_type) -> go.Fig
     else:
         y_col = 'mean_price'
         bar_df = df[[x_axis, PRICE_CHANGE, 'StdDev', 'Count']].drop_duplicates()
-        bar_df.columns = [x_axis, y_col, 'std_price', 'Count']
-        bar_df[x_axis] = pd.Categorical(bar_df[x_axis], categories=df[x_axis].cat.categories, ordered=True)
+        bar_df.columns = [x_axis, y_col, 'std_price', 'Count'] # x_axis keeps its ordered categorical dtype
         hover_data = {
             y_col: ':.1%' if change_type == ChangeMethod.PERCENT else ':.2f',
             'std_price': ':.2f',
@@ -229,7 +227,7 @@ def build_bar_plots(df, x_axis, y_col, label, hover_data, change_type) -> go.Fig
     return fig
 
 
-def build_violin_plots(df, x_axis, label, hover_data) -> go.Figure:
+def build_violin_plots(df, x_axis, label, hover_data, category_order) -> go.Figure:
     fig = px.violin(
         df,
         x=x_axis,
@@ -242,7 +240,7 @@ def build_violin_plots(df, x_axis, label, hover_data) -> go.Figure:
         labels={label: label, x_axis: x_axis},
         color_discrete_sequence=["indigo"]
     )
-    fig.update_layout(xaxis=dict(categoryorder='array', categoryarray=df[x_axis].cat.categories.tolist()))
+    fig.update_layout(xaxis=dict(categoryorder='array', categoryarray=category_order))
     return fig
 
 
@@ -254,6 +252,7 @@ def build_scatter_plots(
     hover_data,
     by_distance=False,
     change_method: Optional[ChangeMethod] = None,
+    category_order: Optional[list] = None,
 ) -> go.Figure:
     logging.info(f"label: {label} x_axis: {x_axis}")
 
@@ -269,15 +268,14 @@ def build_scatter_plots(
         labels={y_col: label, x_axis: x_axis},
         title=f"Rental Price by {x_axis}",
         error_y="StdDev" if change_method else None,
-        trendline="ols"
     )
     fig.update_traces(marker=dict(size=8, opacity=0.7, color='indigo'))
 
-    if y_col != ROOMS and pd.api.types.is_categorical_dtype(df[x_axis]):
+    if y_col != ROOMS and category_order is not None:
         fig.update_layout(
             xaxis=dict(
                 categoryorder='array',
-                categoryarray=df[x_axis].cat.categories.tolist()
+                categoryarray=category_order
             )
         )
 
@@ -292,9 +290,15 @@ def build_scatter_plots(
         pearson_r, pearson_p = pearsonr(x_fit, y_fit)
         spearman_r, spearman_p = spearmanr(x_fit, y_fit)
 
+        # Least squares trendline on the same points (replaces plotly's statsmodels 'ols' trendline)
+        slope, intercept = np.polyfit(x_fit, y_fit, 1)
+        x_line = np.sort(x_fit.to_numpy(dtype=float))
+        fig.add_trace(go.Scatter(x=x_line, y=slope * x_line + intercept, mode="lines", name="OLS", line=dict(color="indigo")))
+
         metrics_text = (
             f"Pearson r = {pearson_r:.2f} (p = {pearson_p:.2f})<br>"
             f"Spearman r = {spearman_r:.2f} (p = {spearman_p:.2f})<br>"
+            f"OLS R² = {pearson_r ** 2:.2f}<br>" # Simple regression R² is the squared Pearson r
         )
 
         fig.add_annotation(
@@ -315,17 +319,16 @@ def build_scatter_plots(
     return fig
 
 
-YEREVAN_CENTRE = (40.1792, 44.4991) # Latitude Longitude
-
 def run_column_checks(df: pd.DataFrame, required_columns: list[str]):
 
     prior_length = len(df)
-    column_checks = []
 
+    # Accumulate into one boolean array rather than allocating a combined Series per column
+    missing = np.zeros(len(df), dtype=bool)
     for col in required_columns:
-        column_checks.append((df[col].isnull()) | (df[col] == ""))
-
-    missing_mask = reduce(operator.or_, column_checks) if column_checks else pd.Series(False, index=df.index)
+        missing |= df[col].isnull().to_numpy()
+        missing |= df[col].eq("").to_numpy(dtype=bool, na_value=False)
+    missing_mask = pd.Series(missing, index=df.index)
 
     excluded_rows = df[missing_mask]
     logging.info(f"Excluded {len(excluded_rows)} of {prior_length} rows with missing {required_columns}")
@@ -335,6 +338,14 @@ def run_column_checks(df: pd.DataFrame, required_columns: list[str]):
     return df
 
 
+def join_place_labels(df: pd.DataFrame, group_columns: list[str]) -> pd.Series:
+    ''' Joins each row's group keys with " – " as a categorical, concatenating whole columns rather than row by row '''
+    labels = df[group_columns[0]].astype(str)
+    for col in group_columns[1:]:
+        labels = labels + " – " + df[col].astype(str)
+    return labels.astype("category")
+
+
 def prepare_visualization_data(
     df: pd.DataFrame,
     group_columns: list[str],
@@ -342,8 +353,11 @@ def prepare_visualization_data(
     min_sample: int = None,
     max_sample: int = None,
     by_distance: bool = False,
-) -> pd.DataFrame:
-    
+) -> tuple[pd.DataFrame, str, Optional[list]]:
+    '''
+    Returns the prepared frame, the x-axis column and its category order (None when the x-axis is not ordered)
+    '''
+
     required_columns = group_columns.copy()
     if change_method == ChangeMethod.PERCENT:
         required_columns.append(STREET)
@@ -362,10 +376,9 @@ def prepare_visualization_data(
             # SUBGROUP BY STREET FOR PERCENT / ABSOLUTE CHANGE
             agg_df = (
                 group_changes
-                .groupby(group_columns, observed=True)[PRICE_CHANGE]
-                .agg(['mean', 'std', 'count'])
+                .groupby(group_columns, observed=True, sort=False)[PRICE_CHANGE]
+                .agg(**{PRICE_CHANGE: 'mean', 'StdDev': 'std', 'Count': 'count'})
                 .reset_index()
-                .rename(columns={'mean': PRICE_CHANGE, 'std': 'StdDev', 'count': 'Count'})
             )
         df = df.merge(agg_df, on=group_columns, how='left')
         df = df.dropna(subset=[PRICE_CHANGE, 'StdDev', 'Count'])
@@ -375,7 +388,7 @@ def prepare_visualization_data(
         # Ensure sample size meets the minimum and maximum size
         pre_sampling_length = len(df)
         df = get_representative_samples(df, group_columns, max_sample, min_sample)
-        df["Count"] = df.groupby(group_columns, observed=True)[MONTHLY_USD_PRICE].transform("count")
+        df["Count"] = df.groupby(group_columns, observed=True, sort=False)[MONTHLY_USD_PRICE].transform("count")
         logging.info(f"Removed {pre_sampling_length - len(df)} of {pre_sampling_length} rows with a min max sample size of {min_sample} : {max_sample}")
 
     x_axis = group_columns[0] # Longitude Latitude
@@ -383,26 +396,34 @@ def prepare_visualization_data(
     if by_distance:
         if LATITUDE not in df.columns or LONGITUDE not in df.columns:
             raise ValueError("Latitude and Longitude required for distance calc.")
-        df[DISTANCE_FROM_CENTRE] = df.apply(compute_distance, axis=1)
+        df[DISTANCE_FROM_CENTRE] = distances_to_yerevan(df[LATITUDE].to_numpy(dtype=float), df[LONGITUDE].to_numpy(dtype=float))
         x_axis = DISTANCE_FROM_CENTRE
 
     if set(group_columns) == {PROVINCE, ADMINISTRATIVE_UNIT}:
-        df[PLACE] = df[group_columns].agg(" – ".join, axis=1)
+        df[PLACE] = join_place_labels(df, group_columns)
         if not by_distance:
             x_axis = PLACE
 
     if not by_distance and group_columns == [PROVINCE]:
         x_axis = PROVINCE
 
+    category_order = None
     if PROVINCE or ADMINISTRATIVE_UNIT in group_columns:
-        order_col = MONTHLY_USD_PRICE if not change_method else PRICE_CHANGE
-        order = df.groupby(x_axis, observed=True)[order_col].median().sort_values().index.tolist()
-        df[x_axis] = pd.Categorical(df[x_axis], categories=order, ordered=True)
+        if change_method and (x_axis == PLACE or group_columns == [x_axis]):
+            # Each group's change is broadcast to all of its rows, so order on the single row per group in 'agg_df'
+            group_stats = agg_df.assign(**{PLACE: join_place_labels(agg_df, group_columns)}) if x_axis == PLACE else agg_df
+            group_stats = group_stats[group_stats[x_axis].isin(df[x_axis].unique())] # Groups left after sampling
+            medians = group_stats.groupby(x_axis, observed=True)[PRICE_CHANGE].median()
+        else:
+            order_col = MONTHLY_USD_PRICE if not change_method else PRICE_CHANGE
+            medians = df.groupby(x_axis, observed=True)[order_col].median()
+        category_order = medians.sort_values().index.tolist()
+        df[x_axis] = pd.Categorical(df[x_axis], categories=category_order, ordered=True)
 
     if change_method == ChangeMethod.PERCENT:
         df[PRICE_CHANGE] *= 100
 
-    return df, x_axis
+    return df, x_axis, category_order
 
 
 def visualize_price_stats(
@@ -415,7 +436,7 @@ def visualize_price_stats(
     max_sample=None,
 ):
 
-    df, x_axis = prepare_visualization_data(df, group_columns, change_method, min_sample, max_sample, by_distance)
+    df, x_axis, category_order = prepare_visualization_data(df, group_columns, change_method, min_sample, max_sample, by_distance)
 
     if GraphType != GraphType.SCATTER:
         by_distance = False
@@ -437,9 +458,9 @@ def visualize_price_stats(
     fig = None
     match graph_type:
         case GraphType.SCATTER:
-            fig = build_scatter_plots(df, x_axis, y_col, label, hover_data, by_distance, change_method)
+            fig = build_scatter_plots(df, x_axis, y_col, label, hover_data, by_distance, change_method, category_order)
         case GraphType.VIOLIN:
-            fig = build_violin_plots(df, x_axis, label, hover_data)
+            fig = build_violin_plots(df, x_axis, label, hover_data, category_order)
         case GraphType.BAR:
             fig = build_bar_plots(df, x_axis, y_col, label, hover_data, change_method)  # Note: you’ll want change_type here to fix hover
 
@@ -471,6 +492,7 @@ if __name__ == "__main__":
 
     training, testing, addresses = load()
     df = pd.concat([training, testing], ignore_index=True)
+    df = categorize_address_columns(df)
 
     if PRESET == VisualizationPreset.DISTANCE_FROM_YEREVAN:
         visualize_price_stats(
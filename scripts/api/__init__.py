@@ -1,9 +1,11 @@
+from types import MappingProxyType
+from typing import Mapping
 from scripts.csv_columns import *
 
 
 YEREVAN_DISTRICTS: set[str] = {"Ajapnyak", "Avan", "Davtashen", "Erebuni", "Kanaker-Zeytun", "Kentron", "Malatia-Sebastia", "Nor Nork", "Nork-Marash", "Nubarashen", "Shengavit", "Arabkir", "Qanaqer-Zeytun"}
 
-NOMINATIM_MAPPING: dict[str, str] = { # https://nominatim.org/release-docs/latest/api/Output/#addressdetails
+NOMINATIM_MAPPING: Mapping[str, str] = MappingProxyType({ # https://nominatim.org/release-docs/latest/api/Output/#addressdetails
     "house_number": BUILDING,
     "road": STREET,
     "highway": STREET,
@@ -20,16 +22,16 @@ NOMINATIM_MAPPING: dict[str, str] = { # https://nominatim.org/release-docs/lates
     "allotments": NEIGHBOURHOOD,
     "subdivision": NEIGHBOURHOOD,
     "city_block": BLOCK
-}
+})
 
-AZURE_MAPPING: dict[str, str] = { # https://learn.microsoft.com/en-us/rest/api/maps/search/get-geocoding?view=rest-maps-2025-01-01&tabs=HTTP#address
+AZURE_MAPPING: Mapping[str, str] = MappingProxyType({ # https://learn.microsoft.com/en-us/rest/api/maps/search/get-geocoding?view=rest-maps-2025-01-01&tabs=HTTP#address
     "countryRegion": COUNTRY,
     "locality": TOWN,
     "neighborhood": NEIGHBOURHOOD,
     "streetName": STREET,
-}
+})
 
-YANDEX_MAPPING: dict[str, str] = { # https://yandex.com/maps-api/docs/geocoder-api/response.html
+YANDEX_MAPPING: Mapping[str, str] = MappingProxyType({ # https://yandex.com/maps-api/docs/geocoder-api/response.html
     "country": COUNTRY,
     "province": PROVINCE,
     "locality": TOWN,
@@ -37,12 +39,12 @@ YANDEX_MAPPING: dict[str, str] = { # https://yandex.com/maps-api/docs/geocoder-a
     "house": BUILDING,
     "area": ADMINISTRATIVE_UNIT,
     "district": NEIGHBOURHOOD,
-}
+})
 
-LIBPOSTAL_MAPPING: dict[str, str] = { # https://github.com/openvenues/libpostal?tab=readme-ov-file#parser-labels
+LIBPOSTAL_MAPPING: Mapping[str, str] = MappingProxyType({ # https://github.com/openvenues/libpostal?tab=readme-ov-file#parser-labels
     "house_number": BUILDING,
     "city": TOWN,
     "state_district": ADMINISTRATIVE_UNIT,
     "state": PROVINCE,
     "country": COUNTRY,
-}
\ No newline at end of file
+})
\ No newline at end of file
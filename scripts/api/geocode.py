@@ -1,7 +1,9 @@
 import asyncio, aiohttp
+import orjson
 import re
 from collections import OrderedDict, defaultdict
 from typing import Any, Optional, Tuple
+import numpy as np
 import pandas as pd
 from tqdm.asyncio import tqdm_asyncio
 from scripts.address.normalize import normalize_address_parts
@@ -19,6 +21,11 @@ STATUS_COLUMN = "Status"
 
 MAX_RETRIES = 4
 RETRY_BACKOFF = 5  # seconds
+MAX_CONCURRENT_ROWS = 64  # rows geocoded in flight at once
+MAX_CONCURRENT_REQUESTS = {"Yandex": 10, "Nominatim": 64, "Azure": 10}  # requests in flight per provider (Nominatim is local)
+KEEPALIVE_TIMEOUT = 75  # seconds an idle pooled connection is kept for reuse
+DNS_CACHE_TTL = 300  # seconds
+REQUEST_TIMEOUT = 30  # seconds
 
 """
 'scripts.api.geocode'
@@ -51,6 +58,10 @@ Fallback:
 Concurrency & Reliability
 -------------------------
   - Uses asyncio + aiohttp for asynchronous API requests  
+  - Bounds the rows in flight with a semaphore (MAX_CONCURRENT_ROWS)  
+  - Bounds the requests in flight to each provider (MAX_CONCURRENT_REQUESTS)  
+  - Reuses pooled keep-alive connections sized to those bounds  
+  - Queries each distinct address once; results persist in GEOCODED_CACHE (delete it to re-query)  
   - Implements retry logic, error handling, and logging  
 
 Returns
@@ -80,7 +91,7 @@ async def query_nominatim(address: str, session: aiohttp.ClientSession) -> dict:
     try:
         async with session.get(NOMINATIM_API_URL, params=params) as response:
             if response.status == 200:
-                data = await response.json()
+                data = orjson.loads(await response.read())
                 if data:
                     components = parse_nominatim_components(data)
                     components['api'] = 'Nominatim'
@@ -101,7 +112,7 @@ async def query_yandex(address: str, session: aiohttp.ClientSession) -> dict:
         try:
             async with session.get(YANDEX_API_URL, params=params) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = orjson.loads(await response.read())
                     if not data:
                         logging.error(f"Yandex returned empty response for '{address}'")
                         return {}
@@ -136,7 +147,7 @@ async def query_azure(address: str, session: aiohttp.ClientSession) -> dict:
     try:
         async with session.get(AZURE_API_URL, params=params) as response:
             if response.status == 200:
-                raw_response: dict = await response.json()
+                raw_response: dict = orjson.loads(await response.read())
                 results = raw_response.get("results", [])
 
                 if not results:
@@ -160,9 +171,9 @@ async def query_azure(address: str, session: aiohttp.ClientSession) -> dict:
         return {}
 
 
-def address_candidates(row: pd.Series) -> list[str]:
-    """ Extracts address candidates using hardcoded columns. """
-    return [address for s in (row.get(ADDRESS, ''), row.get(TRANSLATED, '')) if (address := str(s).strip())]
+def address_candidates(row: dict) -> list[str]:
+    """ Extracts the native and translated address candidates using hardcoded columns ('' when blank or missing). """
+    return ['' if pd.isna(s) else str(s).strip() for s in (row.get(ADDRESS, ''), row.get(TRANSLATED, ''))]
 
 
 
@@ -174,14 +185,55 @@ GEOCODERS = OrderedDict([
 
 GEOCODERS_REVERSED = OrderedDict(reversed(list(GEOCODERS.items())))
 
-async def try_geocoders_on_row(address: str, session: aiohttp.ClientSession) -> dict:
+def geocode_cache_key(address: str) -> str:
+    """ Collapses whitespace and case only; normalize_address_parts would strip Armenian addresses to '' """
+    return " ".join(address.split()).casefold()
+
+
+def load_geocode_cache() -> dict[str, dict]:
+    """ Components by geocode_cache_key from previous runs """
+    if not GEOCODED_CACHE.exists():
+        return {}
+    cache: dict[str, dict] = orjson.loads(GEOCODED_CACHE.read_bytes())
+    logging.info(f"Loaded {len(cache)} cached geocodes from '{GEOCODED_CACHE}'")
+    return cache
+
+
+def save_geocode_cache(cache: dict[str, dict]) -> None:
+    GEOCODED_CACHE.write_bytes(orjson.dumps(cache))
+
+
+async def try_geocoders_on_row(address: str, session: aiohttp.ClientSession, semaphores: dict[str, asyncio.Semaphore], cache: dict[str, dict], pending: dict[str, asyncio.Task]) -> dict:
+    """
+    Geocodes each distinct address once; duplicates reuse the cached or in-flight result.
+    Only successful lookups are cached, so a failed address is shared while in flight and retried afterwards.
+    """
+
+    key = geocode_cache_key(address)
+    if key in cache:
+        return cache[key]
+
+    if key not in pending:
+        pending[key] = asyncio.ensure_future(query_geocoders(address, session, semaphores))
+    try:
+        components = await pending[key]
+    finally:
+        pending.pop(key, None)
+    if components:
+        cache[key] = components
+    return components
+
+
+async def query_geocoders(address: str, session: aiohttp.ClientSession, semaphores: dict[str, asyncio.Semaphore]) -> dict:
 
     geocoders: dict = GEOCODERS if is_non_english_string(address) else GEOCODERS_REVERSED
         
     results: dict[str, Any] = {}
 
     for name, query in geocoders.items():
-        if response := await query(address, session):
+        async with semaphores[name]: # Paces each provider to its own rate limit; 429 backoff keeps the slot
+            response = await query(address, session)
+        if response:
             for key, value in response.items():
                 if key not in results:
                     results[key] = value
@@ -189,22 +241,22 @@ async def try_geocoders_on_row(address: str, session: aiohttp.ClientSession) ->
     return dict(results)
 
 
-async def geocode_row(row: pd.Series, session: aiohttp.ClientSession) -> dict:
+async def geocode_row(row: dict, session: aiohttp.ClientSession, semaphores: dict[str, asyncio.Semaphore], cache: dict[str, dict], pending: dict[str, asyncio.Task]) -> dict:
     """
-    Attempts to geocode a single row using multiple APIs.
+    Attempts to geocode a single row record using multiple APIs, filling in the record in place.
     - Skips geocoding if the row has been geocoded (row["Status"] == "OK").
     - If no services succeed, sets the "Status" to "FAILED".
     """
 
     if row.get(STATUS_COLUMN, 'Pending') == 'OK':
-        return row.to_dict()
+        return row
 
     [native_address, translated] = address_candidates(row)
             
     if not (native_address or translated):
         # Fail if both are missing
         row[STATUS_COLUMN] = 'FAILED'
-        return row.to_dict()
+        return row
 
     # Then query the geocoding services to obtain the full address components including latitude and longitude.
     for candidate in [native_address, translated]:
@@ -212,25 +264,54 @@ async def geocode_row(row: pd.Series, session: aiohttp.ClientSession) -> dict:
         if not candidate: 
             continue
 
-        if components := await try_geocoders_on_row(candidate, session):
+        if components := await try_geocoders_on_row(candidate, session, semaphores, cache, pending):
 
             row[STATUS_COLUMN] = 'OK'
             
             for key, value in components.items(): 
                 row[key] = value
 
-            await asyncio.sleep(2)
-            return row.to_dict()
+            return row
 
     row[STATUS_COLUMN] = 'FAILED'
-    return row.to_dict()
+    return row
 
 
 async def geocode_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    async with aiohttp.ClientSession() as session:
-        tasks = [geocode_row(row, session) for idx, row in df.iterrows()]
-        dicts = await tqdm_asyncio.gather(*tasks)
-        return pd.DataFrame(dicts)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_ROWS)
+    # Created here rather than at import so they bind to the event loop this call runs in
+    semaphores = {name: asyncio.Semaphore(limit) for name, limit in MAX_CONCURRENT_REQUESTS.items()}
+
+    async def bounded_geocode_row(row: dict, session: aiohttp.ClientSession) -> dict:
+        # Keeps a fixed number of requests in flight instead of opening every row at once
+        async with semaphore:
+            return await geocode_row(row, session, semaphores, cache, pending)
+
+    # One pooled connection per request slot; idle connections outlive the gaps between rows so TLS handshakes are reused
+    connector = aiohttp.TCPConnector(
+        limit=sum(MAX_CONCURRENT_REQUESTS.values()),
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL
+    )
+
+    # Rows already geocoded, or without any address, are settled up front rather than scheduled as tasks
+    blank = pd.Series("", index=df.index)
+    done = df.get(STATUS_COLUMN, blank).eq("OK")
+    no_address = df.get(ADDRESS, blank).fillna("").astype(str).str.strip().eq("") & df.get(TRANSLATED, blank).fillna("").astype(str).str.strip().eq("")
+    records = df.to_dict(orient="records") # Plain dicts rather than a Series per row; geocode_row fills them in place
+    for i in np.flatnonzero((no_address & ~done).to_numpy()):
+        records[i][STATUS_COLUMN] = 'FAILED'
+
+    cache: dict[str, dict] = load_geocode_cache() # Successful lookups from earlier runs, extended with this run's
+    pending: dict[str, asyncio.Task] = {} # Lookups in flight, awaited by duplicate addresses
+
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as session:
+            tasks = [bounded_geocode_row(records[i], session) for i in np.flatnonzero((~done & ~no_address).to_numpy())]
+            await tqdm_asyncio.gather(*tasks)
+    finally:
+        save_geocode_cache(cache) # Keeps the lookups made so far if a row raises
+    return pd.DataFrame(records)
 
 
 def load_geocoded_components(df: pd.DataFrame) -> pd.DataFrame:
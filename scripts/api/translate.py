@@ -1,7 +1,8 @@
-import json
 import logging
 import os
+import re
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from google.cloud import translate_v2 as translate
 from scripts.csv_columns import ADDRESS, TRANSLATED
@@ -13,6 +14,8 @@ logging.info(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
 
 MAX_SEGMENTS = 128
 MAX_BYTES = 70_000
+MAX_CONCURRENT_BATCHES = 8 # batch requests in flight at once
+JSON_ESCAPED = re.compile(r'["\\\x00-\x1f]') # Characters JSON escapes; at most 5 extra bytes each (\u00XX)
 
 translator = translate.Client()
 
@@ -35,7 +38,7 @@ def chunk_segments_and_bytes(strings, max_segments=MAX_SEGMENTS, max_bytes=MAX_B
     batch = []
     batch_size = 0
     for s in strings:
-        s_bytes = len(json.dumps(s, ensure_ascii=False).encode('utf-8'))
+        s_bytes = len(s.encode('utf-8')) + 2 + 5 * len(JSON_ESCAPED.findall(s)) # Quoted JSON size, never under the json.dumps(s, ensure_ascii=False) size
         if s_bytes > max_bytes:
             yield [s]
             continue
@@ -81,9 +84,12 @@ def translate_series(
     progress = tqdm(total=len(series), desc="Translating", position=0)
 
     mapping: dict[str, str] = {}
-    for batch in chunk_segments_and_bytes(candidates):
-        translated: list[str] = batch_translate(batch, target)
-        mapping.update(zip(batch, translated))
+    batches: list[list[str]] = list(chunk_segments_and_bytes(list(dict.fromkeys(candidates)))) # Deduplicated
+
+    # Submits the batch requests concurrently and collects them in order
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_BATCHES) as executor:
+        for batch, translated in zip(batches, executor.map(lambda batch: batch_translate(batch, target), batches)):
+            mapping.update(zip(batch, translated))
 
     translated = series.map(lambda s: mapping.get(s, s) if pd.notna(s) else s)
 
@@ -116,7 +122,7 @@ if __name__ == "__main__":
     # python -m scripts.api.translate
     os.environ["ALWAYS_TRANSLATE"] = "True"
     training, testing = load_raw_datasets()
-    unique_addresses: pd.DataFrame = (merge_on_unique([training[ADDRESS], testing[ADDRESS]]).astype(str).to_frame(name=ADDRESS).reset_index(drop=True))
+    unique_addresses: pd.DataFrame = merge_on_unique([training[ADDRESS], testing[ADDRESS]]).astype(str).to_frame(name=ADDRESS)
     load_translations(unique_addresses)
 
 
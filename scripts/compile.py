@@ -1,10 +1,12 @@
 import logging
-import re
+from itertools import islice
+from typing import Iterable, Iterator, Union
 import numpy as np
 import pandas as pd
-from sqlalchemy import Compiled, Insert, Table
-from sqlalchemy.schema import CreateTable
+from sqlalchemy import Insert, Table
+from sqlalchemy.schema import CreateIndex, CreateTable
 from sqlalchemy.dialects.postgresql import insert
+from psycopg2.extras import execute_values
 from database import ROW_INDEX, LINKAGE_MAP, LISTING, PROPERTY
 from database.base import Base
 from database.address import *
@@ -14,11 +16,25 @@ from database.feature import *
 from scripts.address.lookup import administrative_pairs, row_values
 from scripts.process import PREFIX_MAPPING
 from scripts.csv_columns import *
-from settings import SQL_PATH, engine
+from settings import SCHEMA_SQL_PATH, engine
 
 COMPILE_LIST = [PROVINCE, TOWN, RENOVATION, CONSTRUCTION, CURRENCY, EXCHANGE_RATE, ADMINISTRATIVE_UNIT, LISTING, ADDRESS, PROPERTY, AMENITIES, PROPERTY_AMENITIES, APPLIANCES, PROPERTY_APPLIANCES, PARKING, PROPERTY_PARKING]
 
-def build_upserts(df: pd.DataFrame) -> dict[str, list[dict[str, str]]]:
+CATEGORY_COLUMNS = [PROVINCE, TOWN, CURRENCY, RENOVATION, CONSTRUCTION, ADMINISTRATIVE_UNIT]
+
+UPSERT_BATCH_SIZE = 1000 # Rows per executed chunk. Postgres throughput plateaus past ~1000-row batches.
+
+def schema_sql(table: Table) -> tuple[str, ...]:
+    ''' Compiles the CREATE TABLE and foreign key CREATE INDEX statements for a table '''
+    schema = [CreateTable(table, if_not_exists=True)]
+    schema += [CreateIndex(index, if_not_exists=True) for index in table.indexes] # Foreign key indexes
+    return tuple(str(create.compile(engine)).rstrip() + ";\n" for create in schema)
+
+SCHEMA_SQL: dict[str, tuple[str, ...]] = {name: schema_sql(table) for name, table in Base.metadata.tables.items()} # The schema is static, so DDL is compiled once at import
+
+RowValues = Union[pd.DataFrame, list[dict[str, str]]] # Wide tables are kept as DataFrames and streamed as column tuples
+
+def build_upserts(df: pd.DataFrame) -> dict[str, RowValues]:
 
     upserts = {}
 
@@ -37,131 +53,167 @@ def build_upserts(df: pd.DataFrame) -> dict[str, list[dict[str, str]]]:
     upserts[EXCHANGE_RATE] = ExchangeRate.database_entries()
 
     # *PROPERTY Prerequisites
-    upserts[LISTING] = df[LISTING_DB_COLUMNS].to_dict(orient='records')
+    upserts[LISTING] = df[list(LISTING_DB_COLUMNS)]
 
-    upserts[ADDRESS] = df[ADDRESS_DB_COLUMNS].to_dict(orient='records')
+    upserts[ADDRESS] = df[list(ADDRESS_DB_COLUMNS)]
     #*
 
-    df_property = df.copy().assign(**{ADDRESS: df[ROW_INDEX], LISTING: df[ROW_INDEX]})
-    upserts[PROPERTY] = df_property[PROPERTY_DB_COLUMNS].to_dict(orient='records')
+    upserts[PROPERTY] = df.assign(**{ADDRESS: df[ROW_INDEX], LISTING: df[ROW_INDEX]})[list(PROPERTY_DB_COLUMNS)]
 
     # *PROPERTY POSTREQUISITES
-    for name in [AMENITIES, APPLIANCES, PARKING]:
+    prefixes: dict[str, str] = {name: f'{PREFIX_MAPPING[name]}_' for name in [AMENITIES, APPLIANCES, PARKING]}
+    prefixed_columns: dict[str, list[str]] = {
+        name: [col for col in df.columns if col.startswith(prefix)]
+        for name, prefix in prefixes.items()
+    } # Computed once from the static column schema
 
-        id = PREFIX_MAPPING[name]
-        prefix = f'{id}_'
+    for name, prefix in prefixes.items():
 
-        mask: pd.DataFrame = df.filter(regex=f'^{prefix}')
+        columns: list[str] = prefixed_columns[name]
 
-        choices: list[str] = [col[len(prefix):] for col in mask.columns]
+        choices: list[str] = [col[len(prefix):] for col in columns]
         upserts[name] = row_values(choices, 'type')
 
         linkage = LINKAGE_MAP[name] # Property is a prerequisite
-        upserts[linkage] = compile_linkage_values(df, name, prefix, list(mask.columns))
+        upserts[linkage] = compile_linkage_values(df, name, columns, choices)
     #*
 
     return upserts
     
 
-def compile_linkage_values(df: pd.DataFrame, name: str, prefix: str, columns: list[str]) -> list[dict[str, str]]:
-    ''' Acquires the corresponding Amenities / Appliances / Parking linkage for each Property index '''
+def compile_linkage_values(df: pd.DataFrame, name: str, columns: list[str], choices: list[str]) -> list[dict[str, str]]:
+    ''' Acquires the corresponding Amenities / Appliances / Parking linkage for each Property index. 'choices' are the unprefixed column names. '''
 
-    if df[columns].sum(axis=1).eq(0).all():
+    """ Example
+
+    Dummies:
+        ID     1_Air Conditioner    1_Internet    1_Parking Space
+        101    1                    0             1
+
+    Nonzero (row, column) pairs become:
+        {'Property_ID': 101, 'Amenities_type': 'Air Conditioner'}
+        {'Property_ID': 101, 'Amenities_type': 'Parking Space'}
+    
+    """
+
+    rows, cols = np.nonzero(df[columns].eq(1).to_numpy())
+
+    if not rows.size:
         return []
 
     linkage_column = f'{PROPERTY}_{ROW_INDEX}'
+    type_column = f"{name}_type"
 
-    melted: pd.DataFrame = (
-        df[columns + [ROW_INDEX]]
-        .rename(columns={ROW_INDEX: linkage_column})
-        .melt(id_vars=linkage_column) # column 'type' assigned
-        .assign(type=lambda df_: df_['variable'].str.replace(prefix, '', regex=False))
-        .rename(columns={'type': f"{name}_type"})
-        .drop(columns='variable')
-    )
+    ids = df[ROW_INDEX].to_numpy()[rows].tolist() # Python ints for psycopg2 parameter binding
+    types = np.array(choices, dtype=object)[cols]
 
-    """ Example
+    return [{linkage_column: property_id, type_column: type_name} for property_id, type_name in zip(ids, types)]
 
-    Melted:
-        property_id    variable             value
-        101            Air Conditioner     1
-        101            Internet            0
-        101            Parking Space       1
-    
-    """
 
-    matched = melted[melted['value'] == 1].drop(columns=['value'])
+def column_values(series: pd.Series) -> list:
+    ''' Returns a column as Python values. Missing categorical entries become None (not NaN) so they bind as NULL. '''
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = np.append(series.cat.categories.to_numpy(dtype=object), None) # Code -1 (missing) selects the trailing None
+        return categories[series.cat.codes.to_numpy()].tolist()
+    return series.tolist()
 
-    return matched.to_dict(orient='records')
 
+def table_records(table: Table, row_values: RowValues) -> tuple[list[str], list[tuple]]:
+    ''' 
+    Returns the table's column names and the row tuples in that column order.
+    DataFrame columns are converted with tolist() and zipped, skipping the per-row dicts of to_dict('records').
+    '''
+    columns: list[str] = [col.name for col in table.columns] # Matches the column order compiled by insert(table)
 
-def apply_inserts_formatting(compiled_sql: str) -> str:
-    """
-    Formats a bulk SQL INSERT by:
-    - Adding a newline before VALUES
-    - Indenting each value tuple onto its own line
-    """
-    formatted = re.sub(r"\bVALUES\s*\(", "VALUES\n  (", compiled_sql)
-    formatted = re.sub(r"\),\s*\(", "),\n  (", formatted)
-    return formatted + ";\n"
+    if isinstance(row_values, pd.DataFrame):
+        return columns, list(zip(*(column_values(row_values[col]) for col in columns)))
+
+    return columns, [tuple(row[col] for col in columns) for row in row_values]
+
+
+def chunk_rows(rows: Iterable[tuple], size: int = UPSERT_BATCH_SIZE) -> Iterator[list[tuple]]:
+    ''' Yields successive lists of at most 'size' rows '''
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def upsert_statement(table: Table, columns: list[str]) -> Insert:
+    ''' Builds a parameterised ON CONFLICT upsert on the table's primary key. Row values are bound at execution rather than rendered as literals. '''
+
+    clause: Insert = insert(table)
+
+    primary_key = [key.name for key in table.primary_key.columns]
+    set_columns = [col for col in columns if col not in primary_key]
 
+    if not set_columns or len(primary_key) == len(table.columns):
+        # Lookup and link tables are entirely primary key. Existing rows are skipped rather than rewritten.
+        return clause.on_conflict_do_nothing(index_elements=primary_key)
+
+    return clause.on_conflict_do_update(
+        index_elements=primary_key,
+        set_={col: clause.excluded[col] for col in set_columns}
+    )
+
+
+def execute_values_sql(statement: Insert) -> str:
+    ''' Renders an upsert with the single 'VALUES %s' placeholder expected by psycopg2.extras.execute_values '''
+    compiled: str = str(statement.compile(dialect=engine.dialect))
+    insert_into, _, remainder = compiled.partition(" VALUES ")
+    _, _, conflict = remainder.partition(" ON CONFLICT ")
+    return f"{insert_into} VALUES %s ON CONFLICT {conflict}"
 
-def compile_sql(datasets: list[pd.DataFrame]) -> str:
-    ''' Takes a cleaned and parsed DataFrame and compiles SQL inserts for a PostgreSQL database '''
 
-    df: pd.DataFrame = pd.concat([*datasets], ignore_index=True)
+def upsert_datasets(datasets: list[pd.DataFrame]) -> str:
+    ''' 
+    Takes a cleaned and parsed DataFrame and upserts it into a PostgreSQL database.
+    Rows are streamed as bound parameters (psycopg2 execute_values) in chunks, each within its own savepoint. Returns the schema DDL.
+    '''
 
-    df = df.replace({pd.NA: None, np.nan: None, "": None}) # Replaces various 'None' placeholders with 'None' which SQL Alchemy will compile as NULL
+    df: pd.DataFrame = pd.concat(datasets, ignore_index=True, copy=False)
+
+    df = df.replace({pd.NA: None, np.nan: None, "": None}) # Replaces various 'None' placeholders with 'None' which psycopg2 binds as NULL
+
+    for col in CATEGORY_COLUMNS: # Low-cardinality lookup values
+        df[col] = df[col].astype('category')
 
     df[ROW_INDEX] = df.index # Primary / Foreign of Properties / Listings
     
     sql: list[str] = []
 
-    upserts: dict[str, list[dict[str, str]]] = build_upserts(df)
-
-    for table_name, row_values in upserts.items():
-
-        if table_name not in COMPILE_LIST:
-            continue
+    upserts: dict[str, RowValues] = build_upserts(df)
 
-        create: Compiled = CreateTable(Base.metadata.tables[table_name], if_not_exists=True).compile(engine)
-        sql.append(str(create).rstrip() + ";\n")
+    with engine.begin() as connection:
 
-        if not row_values:
-            logging.warning(f"No row values for table '{table_name}', skipping.")
-            continue
+        cursor = connection.connection.cursor() # psycopg2 cursor sharing the transaction
 
-        columns: list[str] = list(row_values[0].keys())
-        index = columns
+        for table in Base.metadata.sorted_tables: # Parents before children, so foreign keys are checked immediately
 
-        if table_name in [PROPERTY, LISTING, ADDRESS]:
-            index = [ROW_INDEX]
+            if table.name not in COMPILE_LIST or table.name not in upserts:
+                continue
 
-        if table_name == EXCHANGE_RATE:
-            index = [CURRENCY, DATE]
+            columns, records = table_records(table, upserts[table.name])
 
-        table: Table = Base.metadata.tables[table_name]
+            schema: list[str] = list(SCHEMA_SQL[table.name])
 
-        logging.info(f"Parsing '{table.name}'")
+            if table.name == EXCHANGE_RATE: # Partitions for the years being loaded
+                schema += ExchangeRate.yearly_partitions(ExchangeRate.load_exchange_rates()[DATE])
 
-        clause: Insert = insert(table).values(row_values)
+            for create in schema:
+                connection.exec_driver_sql(create)
+                sql.append(create)
 
-        excluded = clause.excluded
+            if not records:
+                logging.warning(f"No row values for table '{table.name}', skipping.")
+                continue
 
-        primary_key = [key.name for key in table.primary_key.columns]
-        set_columns = [col for col in columns if col not in primary_key]
+            logging.info(f"Upserting {len(records)} rows into '{table.name}'")
 
-        if set_columns:
-            clause = clause.on_conflict_do_update(
-                index_elements=index,
-                set_={col: getattr(excluded, col) for col in set_columns}
-            )
-        else:
-            clause = clause.on_conflict_do_nothing(index_elements=index)
+            statement: str = execute_values_sql(upsert_statement(table, columns))
 
-        compiled_inserts: str = str(clause.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
-        compiled_inserts: str = apply_inserts_formatting(compiled_inserts)
-        sql.append(compiled_inserts)
+            for chunk in chunk_rows(records):
+                with connection.begin_nested():
+                    execute_values(cursor, statement, chunk, page_size=len(chunk))
 
     return '\n'.join(sql)
 
@@ -172,10 +224,10 @@ if __name__ == "__main__":
     from scripts.load import load
 
     training, testing, addresses = load()
-    sql: str = compile_sql([training, testing])
+    schema: str = upsert_datasets([training, testing])
     
-    with open(SQL_PATH, "w", encoding="utf-8") as file: 
-        file.write(sql)
+    with open(SCHEMA_SQL_PATH, "w", encoding="utf-8") as file: 
+        file.write(schema)
 
 
 
@@ -1,11 +1,12 @@
 
 
 import ast
+from itertools import chain
 import numpy as np
 import pandas as pd
 from pathlib import Path
 from pandas import DataFrame, Series
-from pandas.api.types import is_string_dtype, is_bool_dtype
+from pandas.api.types import is_string_dtype, is_bool_dtype, is_list_like
 from scripts.address.normalize import apply_usd_monthly_pricing, title_strip_remove_punctuation_whitespace, normalize_string
 from scripts.csv_columns import *
 from settings import *
@@ -28,8 +29,8 @@ def column_by_majority_dtype(df: pd.DataFrame, threshold: float = 0.8):
 
 def string_casts(series: Series) -> Series:
     return (
-        series.apply(lambda x: x.strip() if isinstance(x, str) else x)
-              .astype("string")
+        series.astype("string")
+              .str.strip()
               .fillna("")
     )
 
@@ -181,13 +182,20 @@ def explode_addresses_on_index(df: DataFrame, index_column: str) -> DataFrame:
     """Explodes a DataFrame on an index column containing stringified or actual lists."""
     if index_column not in df.columns:
         raise KeyError(f"{index_column} needs to be in 'addresses.csv' to explode on index.")
-    df[index_column] = df[index_column].apply(listify)
-    return df.explode(index_column).reset_index(drop=True)
+    # Scalars stay as single rows and empty lists as a single NaN row, as with DataFrame.explode
+    lists = [value if is_list_like(value) else [value] for value in map(listify, df[index_column])]
+    lists = [value if len(value) else [np.nan] for value in lists]
+    lengths = np.fromiter(map(len, lists), dtype=np.int64, count=len(lists))
+    # Repeats each row once per index in a single take, rather than exploding row by row
+    exploded = df.iloc[np.repeat(np.arange(len(df)), lengths)].reset_index(drop=True)
+    exploded[index_column] = pd.Series(list(chain.from_iterable(lists)), dtype=object)
+    return exploded
 
 
 def merge_on_unique(series: list[Series]) -> Series:
-    """Retrieves unique, non-null values from multiple Series into a single Series"""
-    return pd.concat(series, ignore_index=True).dropna().drop_duplicates()
+    """Retrieves unique, non-null values from multiple Series into a single Series (in order of appearance, with a RangeIndex)"""
+    values: np.ndarray = pd.unique(np.concatenate([s.to_numpy(dtype=object) for s in series]))
+    return pd.Series(values[pd.notna(values)], name=series[0].name, dtype=object)
 
 
 def map_rows_to_address_components(df: pd.DataFrame, addresses: pd.DataFrame) -> pd.DataFrame:
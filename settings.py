@@ -40,11 +40,15 @@ TRAINING_FILE = "apartment_for_rent_train.csv"
 TESTING_FILE = "apartment_for_rent_test.csv"
 
 ADDRESSES = REF_CSV / "addresses.csv"
+ADDRESSES_CACHE = ADDRESSES.with_suffix(".parquet")
 TRANSLATIONS = REF_CSV / "translated.csv"
 GEOCODED = REF_CSV / "geocoded.csv"
+GEOCODED_CACHE = REF_JSON / "geocoded_cache.json"
 
 ARMENIAN_REGION = REF_JSON / "armenian_region.json"
+ARMENIAN_REGION_CACHE = ARMENIAN_REGION.with_suffix(".pickle")
 EXCHANGE_RATES_PATH = REF_JSON / "exchange_rates.json"
+EXCHANGE_RATES_CACHE = EXCHANGE_RATES_PATH.with_suffix(".parquet")
 
 ''' KEYS '''
 
@@ -89,7 +93,10 @@ DB_NAME = "summative"
 DB_ADDRESS = "localhost"
 DB_PORT = 5433 # Changed From Default 5432
 
-engine: Engine = create_engine(f'postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_ADDRESS}:{DB_PORT}/{DB_NAME}')
+engine: Engine = create_engine(
+    f'postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_ADDRESS}:{DB_PORT}/{DB_NAME}',
+    executemany_mode='values_plus_batch' # psycopg2 fast execution helpers for executemany writes
+)
 session: Session = sessionmaker(bind=engine)()
 
-SQL_PATH = OUTPUTS / "database.sql"
\ No newline at end of file
+SCHEMA_SQL_PATH = OUTPUTS / "schema.sql" # DDL only; rows are upserted directly into PostgreSQL
\ No newline at end of file